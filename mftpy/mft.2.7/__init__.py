@@ -34,6 +34,8 @@ Entry    File Name    Description
 """
 
 __all__ = ["entries", "meta", "tools"]
+import mmap
+import os
 from mft.entries import entry
 from mft.meta import boot
 
@@ -48,7 +50,17 @@ def get_bootfile(partition):
     """
     return boot.BootFile(open(partition, 'rb').read(1024))
 
-def get_meta(partition=None):
+def map_partition(partition):
+    """
+    Map the partition read-only. Entries read through buffer() windows of
+    the map are only paged in when they are parsed.
+    """
+    with open(partition, 'rb') as disk:
+        # Block devices report a size of zero, so ask for the end instead
+        disk.seek(0, os.SEEK_END)
+        return mmap.mmap(disk.fileno(), disk.tell(), access=mmap.ACCESS_READ)
+
+def get_meta(partition=None, use_mmap=False):
     """
     Returns the MFT metafiles
     Example:
@@ -64,13 +76,22 @@ def get_meta(partition=None):
 
     bootfile = get_bootfile(partition)
 
+    size = bootfile.get_entry_size()
+
+    if use_mmap:
+        disk = map_partition(partition)
+        offset = bootfile.get_mft_start_offset()
+        for i in xrange(12):
+            yield get_mft(buffer(disk, offset + size * i, size))
+        return
+
     # Open the partition. It must be an NTFS partition
     with open(partition, 'rb+') as partition:
         partition.seek(bootfile.get_mft_start_offset())
         for i in xrange(12):
-            yield get_mft(partition.read(1024))
+            yield get_mft(partition.read(size))
 
-def walk(partition):
+def walk(partition, use_mmap=False):
     """
     Walk the entered partition and return MFT entries one at a time
 
@@ -83,14 +104,26 @@ def walk(partition):
 
     for i in xrange(100):
         print walker.next()
+
+    Pass use_mmap=True to read the entries from a memory map of the
+    partition instead of copying each one out of the file.
     """
     bootdata = open(partition, 'rb').read(1024)
     bootfile = get_bootfile(partition)
+    size = bootfile.get_entry_size()
+
+    if use_mmap:
+        disk = map_partition(partition)
+        offset = bootfile.get_mft_start_offset()
+        while offset + size <= len(disk):
+            yield get_mft(buffer(disk, offset, size))
+            offset += size
+        return
 
     with open(partition, 'rb+') as partition:
         partition.seek(bootfile.get_mft_start_offset())
         while True:
-            yield get_mft(partition.read(1024))
+            yield get_mft(partition.read(size))
 
 def get_mft_start(partition):
 	with open(partition, 'rb') as bootdata:
@@ -98,12 +131,14 @@ def get_mft_start(partition):
 	return bootfile.get_mft_start_offset()
 	
 def extract_entry(partition, entry_number, outfile=None):
-	mft_start = get_mft_start(partition)
+	bootfile = get_bootfile(partition)
+	mft_start = bootfile.get_mft_start_offset()
+	size = bootfile.get_entry_size()
 	with open(partition, 'rb+') as disk:
 		disk.seek(0)
-		entry_offset = 1024 * entry_number
+		entry_offset = size * entry_number
 		disk.seek(mft_start + entry_offset)
-		mft_entry = entry.Entry(disk.read(1024))
+		mft_entry = entry.Entry(disk.read(size))
 
 		if not outfile:
 			outfile = mft.filename
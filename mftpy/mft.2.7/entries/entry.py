@@ -1,6 +1,8 @@
+import struct
 import attributes
 import fields
 from mft.util import byte_range as br
+from mft.util import apply_fixups
 
 
 class Entry(object):
@@ -9,6 +11,14 @@ class Entry(object):
     """
     def __init__(self, data):
         self.raw = data
+        # Attributes are parsed from the entry with the fixups applied
+        self.data = data
+        self.torn = False
+        if data[0:4] == 'FILE':
+            offset, count = struct.unpack_from('<HH', data, 4)
+            if count:
+                self.data, complete = apply_fixups(data, offset, count)
+                self.torn = not complete
         self.signature = fields.StringField(br(data, 0, 3,))
         self.fixup_array_offset = fields.Field(br(data, 4, 5))
         self.fixup_array_entries = fields.Field(br(data, 6, 7))
@@ -21,14 +31,14 @@ class Entry(object):
         self.allocated_size = fields.Field(br(data, 28, 31))
         self.file_ref = fields.Field(br(data, 32, 39))
         self.next_attr_id = fields.Field(br(data, 40, 41))
-        self.attributes_and_fixups = data[42:]
+        self.attributes_and_fixups = self.data[42:]
 
     @property
     def attributes(self):
         """
         Returns the attributes from the MFT entry as a generator
         """
-        data = self.raw[self.attribute_offset.value:]
+        data = self.data[self.attribute_offset.value:]
         offset = 0
         while True:
             data = data[offset:]
@@ -52,7 +62,7 @@ class Entry(object):
         Export items one at a time based on key
         """
         # Ignore the following attributes
-        IGNORE_KEYS = ['raw', 'attributes_and_fixups']
+        IGNORE_KEYS = ['raw', 'data', 'attributes_and_fixups']
         
         for k,v in self.__dict__.items():
             if k not in IGNORE_KEYS:
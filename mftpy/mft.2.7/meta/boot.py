@@ -76,3 +76,25 @@ class BootFile(object):
         Returns the offset to the start of the MFT
         """
         return self.get_cluster_size() * self.mft_start[0]
+
+    def get_entry_size(self):
+        """
+        Returns the size of an MFT entry in bytes
+        """
+        return self.decode_size(self.entry_size[0])
+
+    def get_index_record_size(self):
+        """
+        Returns the size of an index record in bytes
+        """
+        return self.decode_size(self.index_record_size[0])
+
+    def decode_size(self, value):
+        """
+        Sizes are stored in a signed byte. A positive value is a number of
+        clusters. A negative value n means 2 ** -n bytes, so 0xF6 (-10) is
+        1024 bytes.
+        """
+        if value < 0x80:
+            return value * self.get_cluster_size()
+        return 2 ** (0x100 - value)
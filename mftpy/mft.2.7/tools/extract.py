@@ -30,12 +30,14 @@ def extract_meta(partition=None):
         "11_$Extend.txt",
     ]
 
+    size = bootfile.get_entry_size()
+
     with open(partition, 'rb+') as partition:
         partition.seek(bootfile.get_mft_start_offset())
 
         for filename in filenames:
             mftentry = open(filename, "w")
-            mftentry.write(partition.read(1024))
+            mftentry.write(partition.read(size))
             mftentry.close()
 
 
@@ -51,12 +53,14 @@ def extract_mft_files(partition=None, count=1, start=0):
     bootdata = open(partition, 'rb').read(1024)
     bootfile = BootFile(bootdata)
 
+    size = bootfile.get_entry_size()
+
     with open(partition, 'rb+') as partition:
-        offset = bootfile.get_mft_start_offset() + (1024 * start)
+        offset = bootfile.get_mft_start_offset() + (size * start)
         partition.seek(offset)
         for i in xrange(count):
             with open("%s_mft.txt" % i, "w") as mft:
-                mft.write(partition.read(1024))
+                mft.write(partition.read(size))
 
 
 # def list_filenames(partition=r'/dev/sda1', count=1, start=0):
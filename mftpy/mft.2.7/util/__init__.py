@@ -6,3 +6,25 @@ def byte_range(data, start, end=None):
         return data[start:end + 1]
     else:
         return data[start]
+
+
+def apply_fixups(data, offset, count, stride=512):
+    """
+    Returns a copy of the record with the fixup array applied (page 354)
+    and False if a block did not end with the signature value, which means
+    the record was torn by an interrupted write.
+    """
+    fixed = bytearray(data)
+    if offset + 2 * count > len(fixed):
+        return str(fixed), False
+    complete = True
+    for i in range(1, count):
+        end = i * stride
+        if end > len(fixed):
+            complete = False
+            break
+        if fixed[end - 2:end] != fixed[offset:offset + 2]:
+            complete = False
+            continue
+        fixed[end - 2:end] = fixed[offset + 2 * i:offset + 2 * i + 2]
+    return str(fixed), complete
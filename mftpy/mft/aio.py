@@ -0,0 +1,170 @@
+"""
+Walk the MFT from asyncio code
+
+walk() is an async iterator over batches of entries. The reading and
+parsing happen in a thread pool that all walks share, so the event loop is
+never blocked and several images can be scanned at once:
+
+    async def count(name):
+        p = entry.Partition(name)
+        n = 0
+        async for batch in aio.walk(p):
+            n += len(batch)
+        return n
+
+    asyncio.run(asyncio.gather(count('a.raw'), count('b.raw')))
+
+The read statistics of a walk are kept in its own `stats`:
+
+    batches = aio.walk(p)
+    async for batch in batches:
+        ...
+    print(batches.stats['records'])
+
+At most `limit` batches of one image are in flight, however many walks
+read it. A batch is only read when there is room, so a slow consumer holds
+the walk back instead of filling up memory, and one image can't take every
+thread of the pool. The limit is set by the first walk of an image in an
+event loop. Cancelling the task or leaving the loop early drops the
+batches that haven't started.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import parallel
+
+# Threads of the pool shared by all walks
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# Batches of one image read at the same time
+DEFAULT_LIMIT = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# A semaphore for each image, for each event loop
+_image_limits = weakref.WeakKeyDictionary()
+
+
+def default_executor():
+    """
+    Returns the thread pool that walks use unless they are given one
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=DEFAULT_WORKERS, thread_name_prefix='mftpy')
+        return _executor
+
+
+def image_limit(name, limit):
+    """
+    Returns the semaphore that limits the batches read from an image in
+    the running event loop
+    """
+    limits = _image_limits.setdefault(asyncio.get_running_loop(), {})
+    if name not in limits:
+        limits[name] = asyncio.Semaphore(limit)
+    return limits[name]
+
+
+def keep(e):
+    """
+    Passed to parallel.scan_shard to keep the entries themselves
+    """
+    return e
+
+
+def image_size(name):
+    """
+    Returns the size of an image or device
+    """
+    with open(name, 'rb') as image:
+        return os.lseek(image.fileno(), 0, os.SEEK_END)
+
+
+class Walk(object):
+    """
+    The batches of entries of one walk over a Partition, as an async
+    iterator. `stats` holds the read statistics of this walk only, so
+    several walks over the same Partition don't mix them up.
+    """
+    def __init__(self, partition, batch_size=None, limit=DEFAULT_LIMIT,
+                 executor=None):
+        self.partition = partition
+        self.batch_size = batch_size
+        self.limit = limit
+        self.executor = executor or default_executor()
+        self.stats = partition.scan_stats({})
+        self._batches = self._walk()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._batches.__anext__()
+
+    async def aclose(self):
+        """
+        Stops the walk and drops the batches that haven't started
+        """
+        await self._batches.aclose()
+
+    async def _walk(self):
+        partition = self.partition
+        executor = self.executor
+        loop = asyncio.get_running_loop()
+        batch_size = self.batch_size
+        if batch_size is None:
+            batch_size = max(partition.chunk_size // partition.record_size, 1)
+        end = await loop.run_in_executor(executor, image_size, partition.pn)
+        jobs = deque(sorted(
+            parallel.shards(partition.extents, partition.record_size,
+                            batch_size, end),
+            key=lambda extent: extent.offset))
+        stats = self.stats
+        semaphore = image_limit(partition.pn, self.limit)
+
+        def release(future):
+            # Called by the thread once it is done with the batch, even if
+            # the walk stopped waiting for it
+            loop.call_soon_threadsafe(semaphore.release)
+
+        pending = deque()
+        try:
+            while jobs or pending:
+                # Only wait for other walks of the image when there is no
+                # batch of this one to wait for
+                while (jobs and len(pending) < self.limit and
+                       (not pending or not semaphore.locked())):
+                    await semaphore.acquire()
+                    future = executor.submit(
+                        parallel.scan_shard, partition, jobs.popleft(), keep)
+                    future.add_done_callback(release)
+                    pending.append(asyncio.wrap_future(future, loop=loop))
+                batch, shard_stats = await pending.popleft()
+                for key, value in shard_stats.items():
+                    stats[key] = stats.get(key, 0) + value
+                if batch:
+                    yield batch
+        finally:
+            # Every batch opens the image on its own, so batches that are
+            # already running can finish in the background
+            for future in pending:
+                future.cancel()
+
+
+def walk(partition, batch_size=None, limit=DEFAULT_LIMIT, executor=None):
+    """
+    Returns a Walk over the entries of a Partition, which yields lists of
+    at most batch_size entries in the order they are stored on disk.
+    batch_size defaults to the entries in one chunk_size read. limit is
+    the number of batches of the image read at the same time by all its
+    walks. The read statistics are added up in the stats of the Walk.
+    """
+    return Walk(partition, batch_size, limit, executor)
@@ -0,0 +1,222 @@
+"""
+Write the entries of a walk as Apache Arrow record batches or Parquet
+
+The entries are collected into typed columns, batch_size entries at a
+time, and handed on as pyarrow.RecordBatch objects. Timestamps are kept as
+the raw FILETIME in int64 columns and file references as uint64. Every
+$FILE_NAME of an entry goes into the list column file_names, and the types
+of its attributes into attribute_types, a list of names dictionary encoded
+against the type table of the volume.
+
+Usage:
+
+    p = entry.Partition('/dev/sda1')
+    arrow.write_parquet(p.walk(), 'entries.parquet', p.attribute_types)
+
+pyarrow is only needed for this module.
+"""
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+import attributes
+import export
+
+# Entries per record batch
+DEFAULT_BATCH_SIZE = 65536
+
+# FILETIMEs past this don't fit an int64 column and are left out
+MAX_FILETIME = (1 << 63) - 1
+
+SI_TIMES = [
+    ('si_created', 'created'),
+    ('si_altered', 'altered'),
+    ('si_mft_altered', 'mft_altered'),
+    ('si_accessed', 'accessed'),
+]
+FN_TIMES = [
+    ('created', 'file_creation_time'),
+    ('altered', 'file_modification_time'),
+    ('mft_altered', 'mft_modification_time'),
+    ('accessed', 'file_access_time'),
+]
+
+
+def require_pyarrow():
+    if pyarrow is None:
+        raise ImportError("pyarrow is required for Arrow and Parquet export")
+
+
+def file_name_type():
+    return pyarrow.struct([
+        ('name', pyarrow.string()),
+        ('parent_ref', pyarrow.uint64()),
+        ('namespace', pyarrow.uint8()),
+    ] + [(name, pyarrow.int64()) for name, _ in FN_TIMES])
+
+
+def make_schema():
+    """
+    Returns the schema of the record batches
+    """
+    require_pyarrow()
+    return pyarrow.schema([
+        ('record_number', pyarrow.int64()),
+        ('sequence', pyarrow.uint16()),
+        ('flags', pyarrow.uint16()),
+        ('link_count', pyarrow.uint16()),
+        ('lsn', pyarrow.uint64()),
+        ('base_ref', pyarrow.uint64()),
+        ('torn', pyarrow.bool_()),
+        ('size', pyarrow.uint64()),
+    ] + [(name, pyarrow.int64()) for name, _ in SI_TIMES] + [
+        ('si_flags', pyarrow.uint32()),
+        ('file_names', pyarrow.list_(file_name_type())),
+        ('attribute_types', pyarrow.list_(
+            pyarrow.dictionary(pyarrow.int16(), pyarrow.string()))),
+    ])
+
+
+def filetime(value):
+    if value is None or value > MAX_FILETIME:
+        return None
+    return value
+
+
+class BatchBuilder(object):
+    """
+    Collects the columns of one record batch
+    """
+    def __init__(self, types=attributes.DEFAULT_TYPES):
+        self.schema = make_schema()
+        # The attribute type names are indexes into the names of the table
+        self.type_names = []
+        self.type_index = {}
+        for i, info in enumerate(types):
+            if info is not None:
+                self.type_index[i] = len(self.type_names)
+                self.type_names.append(info[0])
+        self.type_dictionary = pyarrow.array(
+            self.type_names, pyarrow.string())
+        self.clear()
+
+    def clear(self):
+        self.columns = dict((name, []) for name in self.schema.names)
+        # Offsets and values of the attribute_types lists
+        self.type_offsets = [0]
+        self.type_indexes = []
+
+    def __len__(self):
+        return len(self.columns['record_number'])
+
+    def add(self, e):
+        columns = self.columns
+        header = e.header
+        columns['record_number'].append(e.record_number)
+        columns['sequence'].append(header.sequence)
+        columns['flags'].append(header.flags)
+        columns['link_count'].append(header.link_count)
+        columns['lsn'].append(header.lsn)
+        columns['base_ref'].append(header.file_ref)
+        columns['torn'].append(e.torn)
+        columns['size'].append(export.data_size(e))
+
+        si = export.standard_info(e)
+        for name, field in SI_TIMES:
+            columns[name].append(filetime(export.content_value(si, field)))
+        columns['si_flags'].append(export.content_value(si, 'si_flags'))
+
+        names = []
+        for attr in e.attributes_by_type.get(48, ()):
+            if not isinstance(attr, attributes.FileName):
+                continue
+            item = {
+                'name': attr.name.value,
+                'parent_ref': export.content_value(attr, 'parent_dir'),
+                'namespace': export.content_value(attr, 'namespace'),
+            }
+            for name, field in FN_TIMES:
+                item[name] = filetime(export.content_value(attr, field))
+            names.append(item)
+        columns['file_names'].append(names)
+
+        for attr in e.attributes:
+            attr_type = attr.header.type
+            if attr_type == attributes.END_MARKER:
+                continue
+            index = None
+            if not attr_type & 0xf:
+                index = self.type_index.get(attr_type >> 4)
+            self.type_indexes.append(index)
+        self.type_offsets.append(len(self.type_indexes))
+
+    def finish(self):
+        """
+        Returns the collected entries as a RecordBatch and starts a new one
+        """
+        arrays = []
+        for field in self.schema:
+            if field.name == 'attribute_types':
+                values = pyarrow.DictionaryArray.from_arrays(
+                    pyarrow.array(self.type_indexes, pyarrow.int16()),
+                    self.type_dictionary)
+                arrays.append(pyarrow.ListArray.from_arrays(
+                    pyarrow.array(self.type_offsets, pyarrow.int32()),
+                    values))
+            else:
+                arrays.append(pyarrow.array(
+                    self.columns[field.name], field.type))
+        batch = pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema)
+        self.clear()
+        return batch
+
+
+def record_batches(entries, types=attributes.DEFAULT_TYPES,
+                   batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yields the entries as record batches of at most batch_size rows. types
+    is the attribute type table of the volume.
+    """
+    require_pyarrow()
+    builder = BatchBuilder(types)
+    for e in entries:
+        builder.add(e)
+        if len(builder) >= batch_size:
+            yield builder.finish()
+    if len(builder):
+        yield builder.finish()
+
+
+def write_parquet(entries, path, types=attributes.DEFAULT_TYPES,
+                  batch_size=DEFAULT_BATCH_SIZE, compression='zstd'):
+    """
+    Writes the entries to a Parquet file, one row group per batch. Returns
+    the number of entries written.
+    """
+    require_pyarrow()
+    count = 0
+    with pyarrow.parquet.ParquetWriter(
+            path, make_schema(), compression=compression) as writer:
+        for batch in record_batches(entries, types, batch_size):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+def write_ipc(entries, path, types=attributes.DEFAULT_TYPES,
+              batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Writes the entries to an Arrow IPC (Feather version 2) file. Returns
+    the number of entries written.
+    """
+    require_pyarrow()
+    count = 0
+    with pyarrow.OSFile(path, 'wb') as sink:
+        with pyarrow.ipc.new_file(sink, make_schema()) as writer:
+            for batch in record_batches(entries, types, batch_size):
+                writer.write_batch(batch)
+                count += batch.num_rows
+    return count
@@ -4,9 +4,15 @@ see page 355
 """
 
 
+import io
 import struct
+from collections import namedtuple
 import fields
-from utils import byte_range as br
+from fields import LazyField
+from exceptions import ValidationError
+import lznt1
+import runlist
+from reader import DEFAULT_CHUNK_SIZE
 
 # See table 11.2 on page 282
 
@@ -29,20 +35,129 @@ ATTRIBUTE_TYPES = {
 }
 
 
-def get_attribute_type(attr_key, version=None):
+def type_table(types):
     """
-    Returns the attribute type based on attribute key
+    Builds an attribute type table from a {type: (name, description)}
+    dictionary. The table is a tuple indexed by type >> 4, as all type ids
+    are multiples of 16. It can't change, so one table is safely shared by
+    every thread that parses entries of a volume.
     """
-    # The following types are different in version 1.2 of Windows NT
-    # FIXME: Find out how to determine version
-    if version == 1.2:
-        ATTRIBUTE_TYPES[64] = ("$VOLUME_VERSION", "Volume information")
-        ATTRIBUTE_TYPES[192] = ("$SYMBOLIC_LINK", "Soft link information")
+    table = [None] * (max(types) // 16 + 1)
+    for attr_type, info in types.items():
+        table[attr_type >> 4] = info
+    return tuple(table)
 
-    try:
-        return ATTRIBUTE_TYPES[attr_key]
-    except KeyError:
+
+def lookup_type(table, attr_type):
+    """
+    Returns the (name, description) of attr_type in a type table, or None
+    """
+    i = attr_type >> 4
+    if attr_type & 0xf or i >= len(table):
         return None
+    return table[i]
+
+
+# The types of NTFS 3.0 and later
+DEFAULT_TYPES = type_table(ATTRIBUTE_TYPES)
+
+# The following types are different in version 1.2 of Windows NT
+NT_TYPES = dict(ATTRIBUTE_TYPES)
+NT_TYPES[64] = ("$VOLUME_VERSION", "Volume information")
+NT_TYPES[192] = ("$SYMBOLIC_LINK", "Soft link information")
+
+VERSION_TYPES = {
+    1.2: type_table(NT_TYPES),
+}
+
+
+def types_for_version(version):
+    """
+    Returns the type table for an NTFS version such as 1.2 or 3.1
+    """
+    return VERSION_TYPES.get(version, DEFAULT_TYPES)
+
+
+# Layout of an $AttrDef entry, see page 372
+ATTRDEF_ENTRY = struct.Struct('<128sLLLLQQ')
+
+
+def attrdef_types(data):
+    """
+    Builds a type table from the content of the $AttrDef file of a volume.
+    Descriptions are taken from ATTRIBUTE_TYPES where the name matches.
+    """
+    descriptions = dict(ATTRIBUTE_TYPES.values())
+    types = {}
+    for offset in range(0, len(data) - ATTRDEF_ENTRY.size + 1,
+                        ATTRDEF_ENTRY.size):
+        label, attr_type = ATTRDEF_ENTRY.unpack_from(data, offset)[:2]
+        if not attr_type:
+            break
+        name = bytes(label).decode('utf-16-le', 'replace').rstrip('\x00')
+        types[attr_type] = (name, descriptions.get(name, ''))
+    if not types:
+        return DEFAULT_TYPES
+    return type_table(types)
+
+
+def get_attribute_type(attr_key, version=None, types=None):
+    """
+    Returns the attribute type based on attribute key, from the type table
+    types or else from the table of version
+    """
+    if types is None:
+        types = types_for_version(version)
+    return lookup_type(types, attr_key)
+
+
+# The fixed headers are decoded with one call each, see tables 13.2 - 13.4
+HEADER = struct.Struct('<LLBBHHH')
+RESIDENT_HEADER = struct.Struct('<LH')
+NON_RESIDENT_HEADER = struct.Struct('<QQHH4xQQQ')
+
+AttributeHeader = namedtuple('AttributeHeader', [
+    'type', 'length', 'non_resident', 'name_length', 'name_offset',
+    'flags', 'attr_id'])
+ResidentHeader = namedtuple('ResidentHeader', [
+    'content_size', 'content_offset'])
+NonResidentHeader = namedtuple('NonResidentHeader', [
+    'vcn_start', 'vcn_end', 'runlist_offset', 'compression_size',
+    'allocated_size', 'actual_size', 'init_size'])
+
+# An entry of an $ATTRIBUTE_LIST, table 13.8 on page 365
+LIST_ENTRY = struct.Struct('<LHBBQQH')
+ListEntry = namedtuple('ListEntry', [
+    'type', 'length', 'name_length', 'name_offset', 'vcn_start', 'file_ref',
+    'attr_id'])
+
+# Type of the marker that ends the attribute list of an entry
+END_MARKER = 0xffffffff
+
+# Attribute flags (page 356)
+COMPRESSED = 0x0001
+ENCRYPTED = 0x4000
+SPARSE = 0x8000
+
+# The class that parses each attribute type, filled in by register()
+ATTRIBUTE_CLASSES = {}
+
+
+def register(attr_type):
+    """
+    Class decorator that makes create() parse attributes of attr_type with
+    the decorated class. A later registration for the same type replaces
+    the earlier one, so parsers can be added or swapped without editing
+    this module:
+
+        @attributes.register(176)
+        class Bitmap(attributes.Attribute):
+            ...
+    """
+    def decorator(cls):
+        ATTRIBUTE_CLASSES[attr_type] = cls
+        return cls
+    return decorator
 
 
 class Attribute(object):
@@ -57,199 +172,446 @@ class Attribute(object):
     10-11         Offset to name                 Yes
     12-13         Flags                          Yes
     14-15         Attribute identifier           Yes
+
+    The headers are decoded into `header` and either `resident_header` or
+    `non_resident_header`. The field objects below are built from the same
+    bytes when they are first read.
+
+    The fixed size numbers of the content are unpacked into `values` with
+    one struct call. The layout is compiled once per subclass from its
+    content fields, with a shorter one for content that stops early.
     """
-    def __init__(self, data):
-        self.attr_type = fields.AttributeTypeField(
-            br(data, 0, 3), verbose='Attribute type')
-        self.attr_length = fields.BaseField(
-            br(data, 4, 7), verbose='Attribute length')
-
-        if not self.attr_type.id == 0xffffffff:
-            self.non_resident = fields.NonResField(
-                br(data, 8, 8), verbose="Non-resident flag")
-            self.name_length = fields.BaseField(
-                br(data, 9, 9), verbose="Name length")
-            self.name_offset = fields.BaseField(
-                br(data, 10, 11), verbose="Name offset")
-            self.flags = fields.BaseField(
-                br(data, 12, 13), verbose="Attribute flags")
-            self.attr_id = fields.BaseField(
-                br(data, 14, 15), verbose="Attribute identifier")
-
-            if self.non_resident.value:
-                self.vcn_start = fields.BaseField(
-                    br(data, 16, 23),
-                    verbose="Virtual cluster number (VCN) start")
-                self.vcn_end = fields.BaseField(
-                    br(data, 24, 31),
-                    verbose="Virtual cluster number (VCN) end")
-                self.runlist_offset = fields.BaseField(
-                    br(data, 32, 33), verbose="Runlist offset")
-                self.compression_size = fields.BaseField(
-                    br(data, 34, 35), verbose="Compression unit size")
-                #self.non_res_unused = fields.BaseField(
-                #    br(data, 36, 39), verbose="Unused")
-                self.attr_allocated_size = fields.BaseField(
-                    br(data, 40, 47), verbose="Attribute allocated size")
-                self.attr_actual_size = fields.BaseField(
-                    br(data, 48, 55), verbose="Attribute actual size")
-                self.attr_init_size = fields.BaseField(
-                    br(data, 56, 63),
-                    verbose="Initialized size of attribute content")
-            else:
-                self.content_size = fields.BaseField(
-                    br(data, 16, 19), verbose="Content size")
-                self.content_offset = fields.BaseField(
-                    br(data, 20, 21), verbose="Content offset")
-                self.content = data[
-                    self.content_offset.value:(
-                        self.content_size.value + self.content_offset.value
-                    )]
+    layout_source = 'content'
+    layout = struct.Struct('<')
+    layout_spec = ()
+    layout_index = {}
+    _layouts = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.layout_spec = fields.layout_spec(cls, cls.layout_source)
+        cls.layout_index = dict(
+            (name, i) for i, (_, _, name) in enumerate(cls.layout_spec))
+        cls._layouts = {}
+        cls.layout = cls.layout_for(None)
+
+    @classmethod
+    def layout_for(cls, length):
+        """
+        Returns the compiled layout of the fields that fit in length bytes
+        of content, or of all fields for a length of None
+        """
+        try:
+            return cls._layouts[length]
+        except KeyError:
+            spec = []
+            for start, size, name in cls.layout_spec:
+                if length is not None and start + size > length:
+                    break
+                spec.append((start, size, name))
+            layout = cls._layouts[length] = fields.compile_layout(spec)
+            return layout
+
+    attr_type = LazyField(
+        fields.AttributeTypeField, 0, 3, verbose='Attribute type',
+        context='types')
+    attr_length = LazyField(
+        fields.BaseField, 4, 7, verbose='Attribute length')
+    non_resident = LazyField(
+        fields.NonResField, 8, 8, verbose="Non-resident flag")
+    name_length = LazyField(
+        fields.BaseField, 9, 9, verbose="Name length")
+    name_offset = LazyField(
+        fields.BaseField, 10, 11, verbose="Name offset")
+    flags = LazyField(
+        fields.BaseField, 12, 13, verbose="Attribute flags")
+    attr_id = LazyField(
+        fields.BaseField, 14, 15, verbose="Attribute identifier")
+
+    vcn_start = LazyField(
+        fields.BaseField, 16, 23,
+        verbose="Virtual cluster number (VCN) start",
+        when='non_resident_header')
+    vcn_end = LazyField(
+        fields.BaseField, 24, 31,
+        verbose="Virtual cluster number (VCN) end",
+        when='non_resident_header')
+    runlist_offset = LazyField(
+        fields.BaseField, 32, 33, verbose="Runlist offset",
+        when='non_resident_header')
+    compression_size = LazyField(
+        fields.BaseField, 34, 35, verbose="Compression unit size",
+        when='non_resident_header')
+    #non_res_unused = LazyField(
+    #    fields.BaseField, 36, 39, verbose="Unused",
+    #    when='non_resident_header')
+    attr_allocated_size = LazyField(
+        fields.BaseField, 40, 47, verbose="Attribute allocated size",
+        when='non_resident_header')
+    attr_actual_size = LazyField(
+        fields.BaseField, 48, 55, verbose="Attribute actual size",
+        when='non_resident_header')
+    attr_init_size = LazyField(
+        fields.BaseField, 56, 63,
+        verbose="Initialized size of attribute content",
+        when='non_resident_header')
+
+    content_size = LazyField(
+        fields.BaseField, 16, 19, verbose="Content size",
+        when='resident_header')
+    content_offset = LazyField(
+        fields.BaseField, 20, 21, verbose="Content offset",
+        when='resident_header')
+
+    def __init__(self, data, types=DEFAULT_TYPES):
+        # The type table of the volume, see type_table
+        self.types = types
+        self.view = memoryview(data)
+        self.header = AttributeHeader._make(HEADER.unpack_from(data))
+        self.resident_header = None
+        self.non_resident_header = None
+        self.values = ()
+
+        if self.header.type == END_MARKER:
+            return
+        if self.header.non_resident:
+            self.non_resident_header = NonResidentHeader._make(
+                NON_RESIDENT_HEADER.unpack_from(data, 16))
+        else:
+            self.resident_header = ResidentHeader._make(
+                RESIDENT_HEADER.unpack_from(data, 16))
+            offset = self.resident_header.content_offset
+            self.content = self.view[
+                offset:offset + self.resident_header.content_size]
+            if self.layout_spec:
+                self.values = self.layout_for(
+                    len(self.content)).unpack_from(self.content)
+
+    @property
+    def runlist(self):
+        """
+        Returns the runlist of a non-resident attribute as a
+        runlist.Runlist. It is decoded on first access only.
+        """
+        if self.non_resident_header is None:
+            raise AttributeError("Resident attributes have no runlist")
+        try:
+            return self._runlist
+        except AttributeError:
+            self._runlist = runlist.decode(
+                self.view[self.non_resident_header.runlist_offset:
+                          self.header.length],
+                self.non_resident_header.vcn_start)
+            return self._runlist
+
+    def content_value(self, name):
+        """
+        Returns the number name of the content, unpacked with the layout of
+        the class, or None if the content is too short for it
+        """
+        i = self.layout_index[name]
+        if i < len(self.values):
+            return self.values[i]
 
     def export(self):
         """
         Export items one at a time based on key
         """
-        # Ignore the following attributes
-        IGNORE_KEYS = ['raw', 'content']
-
-        keys = list(self.__dict__.keys())
-        keys.sort()
-
-        for k in keys:
-            if k not in IGNORE_KEYS:
-                attr = self.__getattribute__(k)
-                if attr.title:
-                    yield("{0}: {1}".format(
-                        attr.title, self.__getattribute__(k)))
-                else:
-                    yield("{0}: {1}".format(k, self.__getattribute__(k)))
+        for k in sorted(fields.lazy_fields(type(self))):
+            try:
+                attr = getattr(self, k)
+            except AttributeError:
+                # Not part of this attribute
+                continue
+            if attr.title:
+                yield("{0}: {1}".format(attr.title, attr))
+            else:
+                yield("{0}: {1}".format(k, attr))
 
+    def extract(self, volume, sink, cluster_size,
+                chunk_size=DEFAULT_CHUNK_SIZE, runs=None):
+        """
+        Write the content of the attribute to sink, a file-like object.
 
+        Non-resident content is read from volume, an open image, in reads
+        of at most chunk_size bytes through one reused buffer. Sparse runs
+        and the space past the initialized size are written as zeros
+        without reading them. runs can replace the attribute's own runlist,
+        for content that is split over several attributes. Compressed
+        content is decompressed, see extract_compressed.
+
+        Returns the number of bytes written.
+        """
+        if self.non_resident_header is None:
+            sink.write(self.content)
+            return len(self.content)
+        if self.header.flags & COMPRESSED:
+            return self.extract_compressed(
+                volume, sink, cluster_size, runs or self.runlist)
+
+        size = self.non_resident_header.actual_size
+        init_size = min(self.non_resident_header.init_size, size)
+        # Read whole clusters
+        chunk_size = max(chunk_size - chunk_size % cluster_size, cluster_size)
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        zeros = memoryview(bytes(chunk_size))
+        written = 0
+        for vcn, lcn, length in (runs or self.runlist):
+            start = vcn * cluster_size
+            end = min(start + length * cluster_size, size)
+            if start >= size:
+                break
+            # Anything in this run past the initialized size reads as zeros
+            data_end = start
+            if lcn is not None:
+                data_end = max(min(end, init_size), start)
+                volume.seek(lcn * cluster_size)
+            while start < data_end:
+                want = min(chunk_size, data_end - start)
+                n = volume.readinto(view[:want])
+                if not n:
+                    raise ValueError(
+                        "Run at cluster {0} is past the end of the "
+                        "volume".format(lcn))
+                sink.write(view[:n])
+                start += n
+                written += n
+            while start < end:
+                n = min(chunk_size, end - start)
+                sink.write(zeros[:n])
+                start += n
+                written += n
+        return written
+
+    def extract_compressed(self, volume, sink, cluster_size, runs):
+        """
+        Write the content of a compressed attribute to sink, one compression
+        unit at a time. A unit without clusters is zeros, a unit with all of
+        its clusters is stored as it is and any other unit holds LZNT1 data
+        in the clusters it has. Returns the number of bytes written.
+        """
+        header = self.non_resident_header
+        if not header.compression_size:
+            raise ValidationError("Compressed attribute without units")
+        size = header.actual_size
+        init_size = min(header.init_size, size)
+        unit = 1 << header.compression_size
+        unit_size = unit * cluster_size
+        written = 0
+        vcn = 0
+        while written < size:
+            end = vcn + unit
+            # The (lcn, length) pieces of the unit that are stored
+            pieces = []
+            sparse = False
+            while vcn < end:
+                try:
+                    i = runs.find(vcn)
+                except IndexError:
+                    break
+                length = min(runs.vcns[i] + runs.lengths[i], end) - vcn
+                if runs.lcns[i] == runlist.SPARSE:
+                    sparse = True
+                else:
+                    pieces.append(
+                        (runs.lcns[i] + vcn - runs.vcns[i], length))
+                vcn += length
+            vcn = end
+            data = bytearray()
+            for lcn, length in pieces:
+                volume.seek(lcn * cluster_size)
+                piece = volume.read(length * cluster_size)
+                if len(piece) < length * cluster_size:
+                    raise ValueError(
+                        "Run at cluster {0} is past the end of the "
+                        "volume".format(lcn))
+                data += piece
+            if sparse and data:
+                data = lznt1.decompress(data, unit_size)
+            n = min(unit_size, size - written)
+            content = memoryview(bytes(data).ljust(n, b'\x00'))[:n]
+            # Anything past the initialized size reads as zeros
+            valid = min(max(init_size - written, 0), n)
+            sink.write(content[:valid])
+            sink.write(bytes(n - valid))
+            written += n
+        return written
+
+
+@register(16)
 class StandardInfo(Attribute):
     """
     $STANDARD_INFORMATION Attribute
     Attribute type = 16
     See page 360
     """
-    def __init__(self, data):
-        super(StandardInfo, self).__init__(data)
-        self.created = fields.WindowsTimeField(
-            br(self.content, 0, 7), verbose="Created")
-        self.altered = fields.WindowsTimeField(
-            br(self.content, 8, 15), verbose="Altered")
-        self.mft_altered = fields.WindowsTimeField(
-            br(self.content, 16, 23), verbose="MFT altered")
-        self.accessed = fields.WindowsTimeField(
-            br(self.content, 24, 31), verbose="Accessed")
-        # Standard info flags
-        self.si_flags = fields.SiFlagsField(
-            br(self.content, 32, 35), verbose="Standard information flags")
-        self.version_max = fields.BaseField(
-            br(self.content, 36, 39), verbose="Maximum versions")
-        self.version = fields.BaseField(
-            br(self.content, 40, 43), verbose="Version")
-        self.class_id = fields.BaseField(
-            br(self.content, 44, 47), verbose="Class ID")
-        self.owner_id = fields.BaseField(
-            br(self.content, 48, 51), verbose="Owner ID")
-        self.security_id = fields.BaseField(
-            br(self.content, 52, 55), verbose="Security ID")
-        self.quota = fields.BaseField(
-            br(self.content, 56, 63), verbose="Quota")
-        # FIXME: Change the verbose name
-        self.usn = fields.BaseField(br(self.content, 64, 71), verbose="USN")
+    created = LazyField(
+        fields.WindowsTimeField, 0, 7, verbose="Created", source='content')
+    altered = LazyField(
+        fields.WindowsTimeField, 8, 15, verbose="Altered", source='content')
+    mft_altered = LazyField(
+        fields.WindowsTimeField, 16, 23, verbose="MFT altered",
+        source='content')
+    accessed = LazyField(
+        fields.WindowsTimeField, 24, 31, verbose="Accessed",
+        source='content')
+    # Standard info flags
+    si_flags = LazyField(
+        fields.SiFlagsField, 32, 35, verbose="Standard information flags",
+        source='content')
+    version_max = LazyField(
+        fields.BaseField, 36, 39, verbose="Maximum versions",
+        source='content')
+    version = LazyField(
+        fields.BaseField, 40, 43, verbose="Version", source='content')
+    class_id = LazyField(
+        fields.BaseField, 44, 47, verbose="Class ID", source='content')
+    owner_id = LazyField(
+        fields.BaseField, 48, 51, verbose="Owner ID", source='content')
+    security_id = LazyField(
+        fields.BaseField, 52, 55, verbose="Security ID", source='content')
+    quota = LazyField(
+        fields.BaseField, 56, 63, verbose="Quota", source='content')
+    # FIXME: Change the verbose name
+    usn = LazyField(
+        fields.BaseField, 64, 71, verbose="USN", source='content')
 
 
 # Attribute type = 42
+@register(48)
 class FileName(Attribute):
     """
     Stores FileNameAttributes
     """
 
     # See page 362
-    def __init__(self, data):
-        super(FileName, self).__init__(data)
-        self.parent_dir = fields.ParentDirField(
-            br(self.content, 0, 7), verbose="Parent directory")
-        self.file_creation_time = fields.WindowsTimeField(
-            br(self.content, 8, 15),
-            verbose="Creation time",
-        )
-        self.file_modification_time = fields.WindowsTimeField(
-            br(self.content, 16, 23),
-            verbose="File modification time",
-        )
-        self.mft_modification_time = fields.WindowsTimeField(
-            br(self.content, 24, 31),
-            verbose="MFT modification time",
-        )
-        self.file_access_time = fields.WindowsTimeField(
-            br(self.content, 32, 39),
-            verbose="File access time",)
-        self.allocated_size = fields.BaseField(
-            br(self.content, 40, 47),
-            verbose="Allocated size",)
-        self.actual_size = fields.BaseField(
-            br(self.content, 48, 55),
-            verbose="Actual size")
-        self.content_flags = fields.BaseField(
-            br(self.content, 56, 59), verbose="Content flags")
-        self.reparse_value = fields.BaseField(
-            br(self.content, 60, 63), verbose="Reparse value")
-        self.name_length = fields.BaseField(
-            br(self.content, 64, 64), verbose="Name length")
-        # FIXME: FIND OUT WHAT NAMESPACE IS FOR
-        self.namespace = fields.BaseField(
-            br(self.content, 65, 65), verbose="Namespace")
-        self.name = fields.FileNameField(
-            self.content[66:self.content_size.value],
-            verbose="File name",
-        )
-
-
+    parent_dir = LazyField(
+        fields.ParentDirField, 0, 7, verbose="Parent directory",
+        source='content')
+    file_creation_time = LazyField(
+        fields.WindowsTimeField, 8, 15,
+        verbose="Creation time",
+        source='content',
+    )
+    file_modification_time = LazyField(
+        fields.WindowsTimeField, 16, 23,
+        verbose="File modification time",
+        source='content',
+    )
+    mft_modification_time = LazyField(
+        fields.WindowsTimeField, 24, 31,
+        verbose="MFT modification time",
+        source='content',
+    )
+    file_access_time = LazyField(
+        fields.WindowsTimeField, 32, 39,
+        verbose="File access time",
+        source='content')
+    allocated_size = LazyField(
+        fields.BaseField, 40, 47,
+        verbose="Allocated size",
+        source='content')
+    actual_size = LazyField(
+        fields.BaseField, 48, 55,
+        verbose="Actual size",
+        source='content')
+    content_flags = LazyField(
+        fields.BaseField, 56, 59, verbose="Content flags", source='content')
+    reparse_value = LazyField(
+        fields.BaseField, 60, 63, verbose="Reparse value", source='content')
+    name_length = LazyField(
+        fields.BaseField, 64, 64, verbose="Name length", source='content')
+    # FIXME: FIND OUT WHAT NAMESPACE IS FOR
+    namespace = LazyField(
+        fields.BaseField, 65, 65, verbose="Namespace", source='content')
+    name = LazyField(
+        fields.FileNameField, 66, fields.END,
+        verbose="File name",
+        source='content',
+    )
+
+
+@register(32)
 class AttributeList(Attribute):
     """
     Page 365
     Attribute type = 32
     """
-    def __init__(self, data):
-        super(AttributeList, self).__init__(data)
-        self.alist_attr_type = fields.AttributeTypeField(
-            br(self.content, 0, 3), verbose="Attribute type")
-        self.alist_entry_length = fields.BaseField(
-            br(self.content, 4, 5), verbose="Entry length")
-        self.alist_name_length = fields.BaseField(
-            br(self.content, 6, 6), verbose="Name length")
-        self.alist_name_offset = fields.BaseField(
-            br(self.content, 7, 7), verbose="Name offset")
-        self.alist_vcn_start = fields.BaseField(
-            br(self.content, 8, 15), verbose="VCN start")
-        self.alist_file_ref = fields.BaseField(
-            br(self.content, 16, 23),
-            verbose="File reference to attribute location")
-        self.alist_attr_id = fields.BaseField(
-            br(self.content, 24, 24), verbose="Attribute ID")
-
-
+    alist_attr_type = LazyField(
+        fields.AttributeTypeField, 0, 3, verbose="Attribute type",
+        source='content', context='types')
+    alist_entry_length = LazyField(
+        fields.BaseField, 4, 5, verbose="Entry length", source='content')
+    alist_name_length = LazyField(
+        fields.BaseField, 6, 6, verbose="Name length", source='content')
+    alist_name_offset = LazyField(
+        fields.BaseField, 7, 7, verbose="Name offset", source='content')
+    alist_vcn_start = LazyField(
+        fields.BaseField, 8, 15, verbose="VCN start", source='content')
+    alist_file_ref = LazyField(
+        fields.BaseField, 16, 23,
+        verbose="File reference to attribute location",
+        source='content')
+    alist_attr_id = LazyField(
+        fields.BaseField, 24, 24, verbose="Attribute ID", source='content')
+
+    def entries(self, volume=None, cluster_size=None):
+        """
+        Yields a ListEntry for every attribute in the list. The content of
+        a non-resident list is read from volume, an open image.
+        """
+        if self.non_resident_header is None:
+            data = self.content
+        else:
+            sink = io.BytesIO()
+            self.extract(volume, sink, cluster_size)
+            data = sink.getvalue()
+        offset = 0
+        while offset + LIST_ENTRY.size <= len(data):
+            item = ListEntry._make(LIST_ENTRY.unpack_from(data, offset))
+            if item.length < LIST_ENTRY.size:
+                break
+            yield item
+            offset += item.length
+
+
+@register(64)
 class ObjectId(Attribute):
     """
     Page 367
     Attribute type = 64
     """
-
-    def __init__(self, data):
-        super(ObjectId, self).__init__(data)
-        self.oid_object_id = fields.BaseField(
-            br(self.content, 0, 15), verbose="Object ID")
-        self.oid_birth_vol_id = fields.BaseField(
-            br(self.content, 16, 31), verbose="Birth volume ID")
-        self.oid_birth_obj_id = fields.BaseField(
-            br(self.content, 32, 47), verbose="Birth object ID")
-        self.oid_birth_dom_id = fields.BaseField(
-            br(self.content, 48, 63), verbose="Birth domain ID")
+    oid_object_id = LazyField(
+        fields.BaseField, 0, 15, verbose="Object ID", source='content')
+    oid_birth_vol_id = LazyField(
+        fields.BaseField, 16, 31, verbose="Birth volume ID",
+        source='content')
+    oid_birth_obj_id = LazyField(
+        fields.BaseField, 32, 47, verbose="Birth object ID",
+        source='content')
+    oid_birth_dom_id = LazyField(
+        fields.BaseField, 48, 63, verbose="Birth domain ID",
+        source='content')
+
+
+@register(112)
+class VolumeInformation(Attribute):
+    """
+    Page 373
+    Attribute type = 112
+    """
+    #vi_unused = LazyField(
+    #    fields.BaseField, 0, 7, verbose="Unused", source='content')
+    vi_major_version = LazyField(
+        fields.BaseField, 8, verbose="Major version", source='content')
+    vi_minor_version = LazyField(
+        fields.BaseField, 9, verbose="Minor version", source='content')
+    vi_flags = LazyField(
+        fields.BaseField, 10, 11, verbose="Volume flags", source='content')
 
 
+@register(128)
 class Data(Attribute):
     """
     Page 364
@@ -259,102 +621,96 @@ class Data(Attribute):
     contents of a file"
     We do not need to define additional fields for this attribute
     """
-    pass
 
 
+@register(144)
 class IndexRoot(Attribute):
     """
     Page 369
     Attribute type = 144
     """
-
-    def __init__(self, data):
-        super(IndexRoot, self).__init__(data)
-        self.ir_attr_type = fields.AttributeTypeField(
-            br(self.content, 0, 3), verbose="Type of attribute in index")
-        self.ir_collation_rule = fields.BaseField(
-            br(self.content, 4, 7), verbose="Collation sorting rule")
-        self.ir_index_byte_size = fields.BaseField(
-            br(self.content, 8, 11), verbose="Index record size (bytes)")
-        self.ir_index_cluster_size = fields.BaseField(
-            br(self.content, 12), verbose="Index record size (clusters)")
-        #self.ir_unused = fields.StringField(
-        #    br(self.content, 13, 15), verbose="Unused")
-        #self.ir_node_header = fields.StringField(
-        #    br(self.content, 16, len(self.content)), verbose="Node header")
-
-
+    ir_attr_type = LazyField(
+        fields.AttributeTypeField, 0, 3, verbose="Type of attribute in index",
+        source='content', context='types')
+    ir_collation_rule = LazyField(
+        fields.BaseField, 4, 7, verbose="Collation sorting rule",
+        source='content')
+    ir_index_byte_size = LazyField(
+        fields.BaseField, 8, 11, verbose="Index record size (bytes)",
+        source='content')
+    ir_index_cluster_size = LazyField(
+        fields.BaseField, 12, verbose="Index record size (clusters)",
+        source='content')
+    #ir_unused = LazyField(
+    #    fields.StringField, 13, 15, verbose="Unused", source='content')
+    #ir_node_header = LazyField(
+    #    fields.StringField, 16, fields.END, verbose="Node header",
+    #    source='content')
+
+
+@register(160)
 class IndexAllocation(Attribute):
     """
     Page 370
     Attribute type = 160
     """
-    def __init__(self, data):
-        super(IndexAllocation, self).__init__(data)
-        #self.ia_signature = fields.StringField(
-            #br(self.content, 0, 3), verbose="Signature")
-        #self.ia_fixup_array_offset = fields.BaseField(
-            #br(self.content, 4, 5), verbose="Offset to fixup array")
-        #self.ia_entries_in_fixup_array = fields.BaseField(
-            #br(self.content, 6, 7),
-            #verbose="Number of entries in fixup array")
-        #self.ia_lsn = fields.BaseField(
-            #br(self.content, 8, 15), verbose="$LogFile sequence number")
-        #self.ia_vcn = fields.BaseField(
-            #br(self.content, 16, 23), verbose="VCN")
-
-
+    #ia_signature = LazyField(
+        #fields.StringField, 0, 3, verbose="Signature", source='content')
+    #ia_fixup_array_offset = LazyField(
+        #fields.BaseField, 4, 5, verbose="Offset to fixup array",
+        #source='content')
+    #ia_entries_in_fixup_array = LazyField(
+        #fields.BaseField, 6, 7,
+        #verbose="Number of entries in fixup array", source='content')
+    #ia_lsn = LazyField(
+        #fields.BaseField, 8, 15, verbose="$LogFile sequence number",
+        #source='content')
+    #ia_vcn = LazyField(
+        #fields.BaseField, 16, 23, verbose="VCN", source='content')
+
+
+@register(192)
 class ReparsePoint(Attribute):
     """
     Page 368
     Attribute type = 192
     """
-
-    def __init__(self, data):
-        super(ReparsePoint, self).__init__(data)
-        self.rpoint_flags = fields.BaseField(
-            br(self.content, 0, 3), verbose="Reparse point flags")
-        self.rpoint_size = fields.BaseField(
-            br(self.content, 4, 5), verbose="Size")
-        #self.rpoint_unused = fields.BaseField(
-        #    br(self.content, 6, 7), verbose="Unused")
-        self.rpoint_target_name_offset = fields.BaseField(
-            br(self.content, 8, 9), verbose="Target name offset")
-        self.rpoint_target_name_length = fields.BaseField(
-            br(self.content, 10, 11), verbose="Target name length")
-        self.rpoint_print_name_offset = fields.BaseField(
-            br(self.content, 12, 13), verbose="Print name offset")
-        self.rpoint_print_name_length = fields.BaseField(
-            br(self.content, 14, 15), verbose="Print name length")
+    rpoint_flags = LazyField(
+        fields.BaseField, 0, 3, verbose="Reparse point flags",
+        source='content')
+    rpoint_size = LazyField(
+        fields.BaseField, 4, 5, verbose="Size", source='content')
+    #rpoint_unused = LazyField(
+    #    fields.BaseField, 6, 7, verbose="Unused", source='content')
+    rpoint_target_name_offset = LazyField(
+        fields.BaseField, 8, 9, verbose="Target name offset",
+        source='content')
+    rpoint_target_name_length = LazyField(
+        fields.BaseField, 10, 11, verbose="Target name length",
+        source='content')
+    rpoint_print_name_offset = LazyField(
+        fields.BaseField, 12, 13, verbose="Print name offset",
+        source='content')
+    rpoint_print_name_length = LazyField(
+        fields.BaseField, 14, 15, verbose="Print name length",
+        source='content')
 
 
 def get_type(data):
     """
     Unpack the data to an integer
     """
-    return struct.unpack('<L', data)[0]
-
-
-def create(data):
-    """
-    Create an MFT entry attribute from the entered data
-    """
-    attr_type = get_type(data[0:4])
-    if attr_type == 16:
-        return StandardInfo(data)
-    if attr_type == 32:
-        return AttributeList(data)
-    if attr_type == 48:
-        return FileName(data)
-    if attr_type == 64:
-        return ObjectId(data)
-    if attr_type == 128:
-        return Data(data)
-    if attr_type == 144:
-        return IndexRoot(data)
-    if attr_type == 160:
-        return IndexAllocation(data)
-    if attr_type == 192:
-        return ReparsePoint(data)
-    if attr_type in ATTRIBUTE_TYPES:
-        return Attribute(data)
+    return struct.unpack_from('<L', data)[0]
+
+
+def create(data, types=DEFAULT_TYPES):
+    """
+    Create an MFT entry attribute from the entered data. types is the type
+    table of the volume.
+    """
+    attr_type = get_type(data)
+    cls = ATTRIBUTE_CLASSES.get(attr_type)
+    if cls is None and lookup_type(types, attr_type):
+        cls = Attribute
+    if cls is not None:
+        return cls(data, types)
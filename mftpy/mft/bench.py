@@ -0,0 +1,262 @@
+"""
+Benchmark the parsing paths on a synthetic image
+
+    python bench.py --records 100000 --repeat 3 -o results.json
+
+An image is generated with synthetic.py, unless one is given with --image,
+and every benchmark is run on it in a fresh process, so that its peak
+resident set size (RSS) is its own. The results are printed as JSON with
+the entries per second of the best run, which is easy to compare between
+commits or machines.
+
+Benchmarks:
+
+    entry       Build an Entry from every raw record and decode its header
+    attributes  Build Entries and iterate over their attributes
+    walk        Partition.walk with buffered reads
+    walk_mmap   Partition.walk over a memory map
+    parallel    parallel.scan with --workers processes
+    columnar    columnar.scan, if NumPy is installed
+    export      export.write_csv of the walk to os.devnull
+    compressed  Partition.extract of every compressed $DATA attribute. On a
+                synthetic image the content is checked as well.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import attributes
+import entry
+import reader
+import synthetic
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def raw_records(partition):
+    """
+    Returns the raw records of the MFT as a list of bytes
+    """
+    with open(partition.pn, 'rb') as image:
+        return [bytes(data) for _, data in partition.open_reader(image)]
+
+
+def bench_entry(partition, records, options):
+    count = 0
+    for number, data in enumerate(records):
+        e = entry.Entry(data, number)
+        e.header
+        count += 1
+    return count
+
+
+def bench_attributes(partition, records, options):
+    count = 0
+    for number, data in enumerate(records):
+        e = entry.Entry(data, number)
+        if e.header.signature != entry.FILE_SIGNATURE:
+            continue
+        for attr in e.attributes:
+            attr.header
+        count += 1
+    return count
+
+
+def bench_walk(partition, records, options):
+    return sum(1 for _ in partition.walk())
+
+
+def bench_walk_mmap(partition, records, options):
+    partition.use_mmap = True
+    return sum(1 for _ in partition.walk())
+
+
+def bench_parallel(partition, records, options):
+    import parallel
+    return sum(len(batch) for batch in parallel.scan(
+        partition, workers=options['workers']))
+
+
+def bench_columnar(partition, records, options):
+    import columnar
+    return sum(len(columns['record_number'])
+               for columns in columnar.scan(partition))
+
+
+def bench_export(partition, records, options):
+    import export
+    with open(os.devnull, 'w') as sink:
+        return export.write_csv(partition.walk(), sink)
+
+
+def bench_compressed(partition, records, options):
+    count = 0
+    for e in partition.walk():
+        for attr in e.attributes_by_type.get(128, ()):
+            if (attr.non_resident_header is None or attr.header.name_length
+                    or not attr.header.flags & attributes.COMPRESSED):
+                continue
+            sink = io.BytesIO()
+            partition.extract(e, sink)
+            if (options['synthetic'] and
+                    sink.getvalue() != synthetic.COMPRESSED_CONTENT):
+                raise ValueError("Entry {0} doesn't decompress to its "
+                                 "content".format(e.record_number))
+            count += 1
+    return count
+
+
+BENCHMARKS = {
+    'entry': bench_entry,
+    'attributes': bench_attributes,
+    'walk': bench_walk,
+    'walk_mmap': bench_walk_mmap,
+    'parallel': bench_parallel,
+    'columnar': bench_columnar,
+    'export': bench_export,
+    'compressed': bench_compressed,
+}
+
+# Benchmarks that work on the raw records instead of the image
+NEEDS_RECORDS = ('entry', 'attributes')
+
+
+def peak_rss():
+    """
+    Returns the peak RSS of this process in bytes, or None if it can't be
+    measured
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform != 'darwin':
+        peak *= 1024
+    return peak
+
+
+def run(name, image, repeat, options):
+    """
+    Runs one benchmark repeat times and returns its result. Meant to run in
+    a process of its own.
+    """
+    partition = entry.Partition(image, chunk_size=options['chunk_size'])
+    records = raw_records(partition) if name in NEEDS_RECORDS else None
+    bench = BENCHMARKS[name]
+    times = []
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = bench(partition, records, options)
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        'name': name,
+        'entries': count,
+        'seconds': best,
+        'entries_per_second': count / best if best else None,
+        'mb_per_second': (partition.mft_size() / 1024.0 / 1024.0 / best
+                          if best else None),
+        'runs': times,
+        'peak_rss_bytes': peak_rss(),
+    }
+
+
+def run_child(connection, *args):
+    try:
+        connection.send(run(*args))
+    finally:
+        connection.close()
+
+
+def run_in_process(context, *args):
+    """
+    Runs a benchmark in a new process and returns its result. Not a Pool,
+    whose daemonic workers can't start the processes of parallel.scan.
+    """
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_child, args=(sender,) + args)
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        raise RuntimeError("Benchmark {0} failed with exit code {1}".format(
+            args[0], process.exitcode))
+    return result
+
+
+def available(name):
+    if name == 'columnar':
+        import columnar
+        return columnar.numpy is not None
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark mftpy on a synthetic image')
+    parser.add_argument('--image', help='Use this image instead of '
+                                        'generating one')
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fragments', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int,
+                        default=reader.DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS),
+                        help='Run only this benchmark, can be repeated')
+    parser.add_argument('-o', '--output', help='Write the JSON here too')
+    args = parser.parse_args(argv)
+
+    options = {'workers': args.workers, 'chunk_size': args.chunk_size,
+               'synthetic': args.image is None}
+    names = args.only or [name for name in sorted(BENCHMARKS)
+                          if available(name)]
+    with tempfile.TemporaryDirectory() as directory:
+        image = args.image
+        if image is None:
+            image = os.path.join(directory, 'synthetic.raw')
+            synthetic.generate(image, args.records, args.seed,
+                               fragments=args.fragments)
+        results = []
+        context = multiprocessing.get_context('spawn')
+        for name in names:
+            results.append(run_in_process(
+                context, name, image, args.repeat, options))
+
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'image': args.image,
+        'records': None if args.image else args.records,
+        'seed': args.seed,
+        'fragments': None if args.image else args.fragments,
+        'repeat': args.repeat,
+        'options': options,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as sink:
+            sink.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
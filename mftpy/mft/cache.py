@@ -0,0 +1,380 @@
+"""
+Keep the summaries of scanned volumes in an SQLite database
+
+A volume is known by the serial number in its boot sector alone, so two
+images with the same serial, copies of one volume taken at different
+times for example, share their stored entries. Scan them with verify=True
+or use a Cache for each. The first scan
+of a volume parses every entry and stores its entry.Summary together with
+the $LogFile sequence number (LSN) and the sequence number of the record.
+Later scans read the records again but only parse the ones whose LSN or
+sequence number changed. An MFT that grew keeps what is stored, only the
+records past its old end are new.
+
+The database holds many volumes. When it grows past max_bytes the volumes
+that were used least recently are dropped.
+
+rescan() reports which entries were added, modified, deleted or
+reallocated since the previous scan of a volume.
+
+Usage:
+
+    p = entry.Partition('/dev/sda1')
+    with cache.Cache() as c:
+        for summary in c.scan(p):
+            print(summary.record_number, summary.filename)
+        # Later on
+        changes = c.rescan(p)
+        for summary in changes.deleted:
+            print('Deleted', summary.filename)
+"""
+
+import os
+import sqlite3
+import struct
+import time
+from array import array
+from collections import namedtuple
+import entry
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.mftpy', 'cache.db')
+
+# Default limit of the database size
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Rows written per transaction
+BATCH_SIZE = 10000
+
+# The LSN and the sequence number of a record, bytes 8-17 of the header
+STAMP = struct.Struct('<QH')
+STAMP_OFFSET = 8
+
+SIGNATURE = struct.Struct('<L')
+
+# The entries that changed between two scans, as lists of entry.Summary.
+# added entries are newly in use, modified ones kept their sequence number
+# and reallocated ones were deleted and their record used again for another
+# file. deleted entries are no longer in use; they are reported as they
+# were last seen if the record was overwritten.
+ChangeSet = namedtuple('ChangeSet', [
+    'added', 'modified', 'deleted', 'reallocated'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS volumes (
+    id INTEGER PRIMARY KEY,
+    serial INTEGER NOT NULL,
+    mft_size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    UNIQUE (serial)
+);
+CREATE TABLE IF NOT EXISTS records (
+    volume INTEGER NOT NULL,
+    record_number INTEGER NOT NULL,
+    lsn INTEGER NOT NULL,
+    sequence INTEGER NOT NULL,
+    valid INTEGER NOT NULL,
+    flags INTEGER,
+    link_count INTEGER,
+    base_ref INTEGER,
+    parent_ref INTEGER,
+    filename TEXT,
+    torn INTEGER,
+    PRIMARY KEY (volume, record_number)
+) WITHOUT ROWID;
+"""
+
+# Columns of a records row that make up an entry.Summary, in order
+SUMMARY_COLUMNS = (
+    'record_number, sequence, flags, link_count, lsn, base_ref, parent_ref, '
+    'filename, torn')
+
+
+def to_signed(value):
+    """
+    SQLite stores signed 64 bit integers, so unsigned values with the top
+    bit set are stored as negative numbers
+    """
+    if value is not None and value >= 1 << 63:
+        return value - (1 << 64)
+    return value
+
+
+def to_unsigned(value):
+    if value is not None and value < 0:
+        return value + (1 << 64)
+    return value
+
+
+def summary_from_row(row):
+    """
+    Returns the entry.Summary of a row selected with SUMMARY_COLUMNS
+    """
+    (number, sequence, flags, link_count, lsn, base_ref, parent_ref,
+     filename, torn) = row
+    return entry.Summary(
+        number, sequence, flags, link_count, to_unsigned(lsn),
+        to_unsigned(base_ref), to_unsigned(parent_ref), filename, bool(torn))
+
+
+class Cache(object):
+    """
+    An SQLite database of the summaries of scanned volumes
+    """
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        if path != ':memory:':
+            directory = os.path.dirname(os.path.abspath(path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path)
+        # Only has an effect on a new database. It lets evict() give the
+        # space of dropped volumes back to the file system.
+        self.db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self.db.executescript(SCHEMA)
+        # Counts of the last scan
+        self.stats = {}
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def volume(self, partition, create=True):
+        """
+        Returns the id of a Partition in the database and marks it as used.
+        Returns None for an unknown volume if create is False.
+
+        The MFT of a volume in use grows, so a volume is found by its
+        serial number alone and keeps its stored entries when the size of
+        its MFT changes.
+        """
+        serial = to_signed(partition.serial_number)
+        with self.db:
+            row = self.db.execute(
+                'SELECT id FROM volumes WHERE serial = ?',
+                (serial,)).fetchone()
+            if row is None:
+                if not create:
+                    return None
+                # Nothing is stored yet, update() sets the size
+                return self.db.execute(
+                    'INSERT INTO volumes (serial, mft_size, last_used) '
+                    'VALUES (?, 0, ?)', (serial, time.time())).lastrowid
+            self.db.execute('UPDATE volumes SET last_used = ? WHERE id = ?',
+                            (time.time(), row[0]))
+            return row[0]
+
+    def stored_size(self, volume):
+        """
+        Returns the size of the MFT of a volume when it was last updated
+        """
+        return self.db.execute('SELECT mft_size FROM volumes WHERE id = ?',
+                               (volume,)).fetchone()[0]
+
+    def stamps(self, volume):
+        """
+        Returns the stored LSNs, sequence numbers and in use flags of a
+        volume as three arrays indexed by entry number. Records that aren't
+        stored have a sequence number of -1.
+        """
+        lsns = array('q')
+        sequences = array('l')
+        in_use = array('b')
+        for number, lsn, sequence, used in self.db.execute(
+                'SELECT record_number, lsn, sequence, '
+                'valid AND flags & ? FROM records '
+                'WHERE volume = ? ORDER BY record_number',
+                (entry.IN_USE, volume)):
+            missing = number - len(lsns)
+            if missing > 0:
+                lsns.extend([0] * missing)
+                sequences.extend([-1] * missing)
+                in_use.extend([0] * missing)
+            lsns.append(lsn)
+            sequences.append(sequence)
+            in_use.append(1 if used else 0)
+        return lsns, sequences, in_use
+
+    def stored(self, volume, number):
+        """
+        Returns the stored entry.Summary of an entry, or None
+        """
+        row = self.db.execute(
+            'SELECT ' + SUMMARY_COLUMNS + ' FROM records '
+            'WHERE volume = ? AND record_number = ? AND valid',
+            (volume, number)).fetchone()
+        if row is not None:
+            return summary_from_row(row)
+
+    def update(self, partition, volume, changes=None):
+        """
+        Reads the records of a Partition and parses the ones whose LSN or
+        sequence number differs from the stored one. Records that are no
+        longer in use as MFT entries are dropped.
+
+        If changes is a ChangeSet, the entries that changed since the last
+        update are added to it, see rescan().
+        """
+        lsns, sequences, in_use = self.stamps(volume)
+        seen = array('b', bytes(len(sequences)))
+        stats = self.stats = {'records': 0, 'parsed': 0, 'cached': 0,
+                              'dropped': 0}
+        rows = []
+        types = partition.attribute_types
+        with open(partition.pn, 'rb') as image:
+            records = partition.open_reader(image)
+            try:
+                for number, data in records:
+                    stats['records'] += 1
+                    if SIGNATURE.unpack_from(data)[0] != entry.FILE_SIGNATURE:
+                        continue
+                    known = number < len(sequences) and sequences[number] >= 0
+                    if known:
+                        seen[number] = 1
+                    lsn, sequence = STAMP.unpack_from(data, STAMP_OFFSET)
+                    lsn = to_signed(lsn)
+                    if (known and lsns[number] == lsn and
+                            sequences[number] == sequence):
+                        stats['cached'] += 1
+                        continue
+                    stats['parsed'] += 1
+                    e = entry.parse_record(data, number, types)
+                    s = None if e is None else e.summary()
+                    if changes is not None:
+                        was_used = known and in_use[number]
+                        self._classify(
+                            changes, volume, number, s, was_used,
+                            was_used and sequences[number] != sequence)
+                    if s is None:
+                        rows.append((volume, number, lsn, sequence, 0,
+                                     None, None, None, None, None, None))
+                    else:
+                        rows.append((
+                            volume, number, lsn, sequence, 1, s.flags,
+                            s.link_count, to_signed(s.base_ref),
+                            to_signed(s.parent_ref), s.filename,
+                            int(s.torn)))
+                    if len(rows) >= BATCH_SIZE:
+                        self._store(rows)
+                        rows = []
+            finally:
+                if partition.use_mmap:
+                    records.close()
+        self._store(rows)
+
+        # Whatever wasn't read again or isn't a FILE record anymore
+        gone = [number for number in range(len(sequences))
+                if sequences[number] >= 0 and not seen[number]]
+        if changes is not None:
+            for number in gone:
+                if in_use[number]:
+                    changes.deleted.append(self.stored(volume, number))
+        with self.db:
+            self.db.executemany(
+                'DELETE FROM records WHERE volume = ? AND record_number = ?',
+                [(volume, number) for number in gone])
+            self.db.execute('UPDATE volumes SET mft_size = ? WHERE id = ?',
+                            (partition.mft_size(), volume))
+        stats['dropped'] = len(gone)
+
+    def _classify(self, changes, volume, number, summary, was_used, reused):
+        """
+        Adds a parsed entry to a ChangeSet. summary is None for a record
+        that no longer holds a valid entry.
+        """
+        if summary is not None and summary.flags & entry.IN_USE:
+            if reused:
+                changes.reallocated.append(summary)
+            elif was_used:
+                changes.modified.append(summary)
+            else:
+                changes.added.append(summary)
+        elif was_used:
+            # A deleted entry keeps its name, report what was stored
+            if summary is None:
+                summary = self.stored(volume, number)
+            changes.deleted.append(summary)
+
+    def _store(self, rows):
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO records VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def summaries(self, volume):
+        """
+        Yields the stored entry.Summary of every valid entry of a volume in
+        entry number order
+        """
+        for row in self.db.execute(
+                'SELECT ' + SUMMARY_COLUMNS + ' FROM records '
+                'WHERE volume = ? AND valid ORDER BY record_number',
+                (volume,)):
+            yield summary_from_row(row)
+
+    def scan(self, partition, verify=True):
+        """
+        Yields the entry.Summary of every entry of a Partition like
+        Entry.summary would, parsing only the records that changed since
+        the last scan. With verify=False a volume that is in the cache is
+        not read at all, unless the size of its MFT changed.
+        """
+        volume = self.volume(partition, create=False)
+        if (volume is None or verify or
+                self.stored_size(volume) != partition.mft_size()):
+            if volume is None:
+                volume = self.volume(partition)
+            self.update(partition, volume)
+            self.evict(keep=volume)
+        else:
+            self.stats = {}
+        return self.summaries(volume)
+
+    def rescan(self, partition):
+        """
+        Updates the stored entries of a Partition and returns a ChangeSet
+        of what changed since the last scan. Only records whose LSN or
+        sequence number changed are parsed. On the first scan of a volume
+        every entry in use is added.
+        """
+        volume = self.volume(partition)
+        changes = ChangeSet([], [], [], [])
+        self.update(partition, volume, changes)
+        self.evict(keep=volume)
+        return changes
+
+    def size(self):
+        """
+        Returns the number of bytes the database uses
+        """
+        page_size = self.db.execute('PRAGMA page_size').fetchone()[0]
+        pages = self.db.execute('PRAGMA page_count').fetchone()[0]
+        free = self.db.execute('PRAGMA freelist_count').fetchone()[0]
+        return (pages - free) * page_size
+
+    def evict(self, keep=None):
+        """
+        Drops the least recently used volumes, except keep, until the
+        database is no larger than max_bytes
+        """
+        while self.size() > self.max_bytes:
+            row = self.db.execute(
+                'SELECT id FROM volumes WHERE id != ? '
+                'ORDER BY last_used LIMIT 1', (keep,)).fetchone()
+            if row is None:
+                break
+            self.drop(row[0])
+        self.db.execute('PRAGMA incremental_vacuum')
+
+    def drop(self, volume):
+        """
+        Removes a volume and its records from the database
+        """
+        with self.db:
+            self.db.execute('DELETE FROM records WHERE volume = ?', (volume,))
+            self.db.execute('DELETE FROM volumes WHERE id = ?', (volume,))
@@ -0,0 +1,270 @@
+"""
+Scan an image from the command line
+
+    python cli.py scan IMAGE [-f csv] [-o entries.csv] [--range 0:1000]
+                             [--in-use] [--name '*.exe'] [--workers 4]
+
+The entries are written to the output, or to stdout, and a summary of the
+scan goes to stderr at the end: entries per second, megabytes read per
+second and the number of bad, zero, unused and torn records. With
+--progress the same line is printed every few seconds while scanning.
+"""
+
+import argparse
+import fnmatch
+import sys
+import time
+import entry
+import export
+from exceptions import ValidationError
+import parallel
+import paths
+import reader
+
+FORMATS = ['csv', 'jsonl', 'bodyfile', 'parquet', 'arrow', 'none']
+
+# Formats that need whole entries, not summaries from several workers
+ENTRY_FORMATS = ['bodyfile', 'parquet', 'arrow']
+
+SIZE_SUFFIXES = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_size(value):
+    """
+    Parses a size such as 4096, 64k or 16M
+    """
+    value = value.strip().lower()
+    factor = SIZE_SUFFIXES.get(value[-1:], 1)
+    if factor != 1:
+        value = value[:-1]
+    try:
+        return int(value) * factor
+    except ValueError:
+        raise argparse.ArgumentTypeError("Invalid size {0}".format(value))
+
+
+def parse_range(value):
+    """
+    Parses an entry range START:END, where END is not included and both
+    can be left out
+    """
+    start, sep, end = value.partition(':')
+    try:
+        if not sep:
+            return int(start), int(start) + 1
+        return int(start or 0), (int(end) if end else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Invalid range {0}".format(value))
+
+
+def merge_ranges(ranges):
+    """
+    Returns ranges sorted by their start, with the ones that overlap or
+    touch merged, so every entry is only scanned once
+    """
+    merged = []
+    for first, end in sorted(ranges, key=lambda r: r[0]):
+        if end is not None and end <= first:
+            continue
+        if merged:
+            last_first, last_end = merged[-1]
+            if last_end is None:
+                break
+            if first <= last_end:
+                merged[-1] = (last_first,
+                              None if end is None else max(end, last_end))
+                continue
+        merged.append((first, end))
+    return merged
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='mftpy', description='Parse the MFT of an NTFS image')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    scan = commands.add_parser('scan', help='Scan the entries of an image')
+    scan.add_argument('image', help='NTFS image or device')
+    scan.add_argument('-f', '--format', choices=FORMATS, default='csv',
+                      help='Output format (default: csv)')
+    scan.add_argument('-o', '--output', default='-',
+                      help='Output file, - for stdout. A .gz or .zst '
+                           'extension compresses it.')
+    scan.add_argument('--fields',
+                      help='Comma separated fields for csv and jsonl '
+                           '(default: {0})'.format(
+                               ','.join(export.DEFAULT_FIELDS)))
+    scan.add_argument('--range', dest='ranges', action='append',
+                      type=parse_range, metavar='START:END',
+                      help='Only scan these entry numbers. Can be given '
+                           'more than once.')
+    state = scan.add_mutually_exclusive_group()
+    state.add_argument('--in-use', action='store_true',
+                       help='Only entries that are in use')
+    state.add_argument('--deleted', action='store_true',
+                       help='Only entries that are not in use')
+    kind = scan.add_mutually_exclusive_group()
+    kind.add_argument('--dirs', action='store_true',
+                      help='Only directories')
+    kind.add_argument('--files', action='store_true',
+                      help='Only files')
+    scan.add_argument('--name', help='Only names matching this pattern')
+    scan.add_argument('--paths', action='store_true',
+                      help='Resolve full paths first, for the path field '
+                           'and the bodyfile')
+    scan.add_argument('--workers', type=int, default=1,
+                      help='Worker processes (default: 1). With more than '
+                           'one only summary fields are available.')
+    scan.add_argument('--chunk-size', type=parse_size,
+                      default=reader.DEFAULT_CHUNK_SIZE,
+                      help='Size of a single read (default: 16M)')
+    scan.add_argument('--mmap', action='store_true',
+                      help='Map the image instead of reading it')
+    scan.add_argument('--progress', type=float, metavar='SECONDS',
+                      help='Report progress to stderr this often')
+    return parser
+
+
+def make_filter(args):
+    """
+    Returns a function that tells if an Entry or entry.Summary passes the
+    filters of the command line, or None without filters
+    """
+    name = export.getter('filename')
+
+    def flags(e):
+        if isinstance(e, entry.Summary):
+            return e.flags
+        return e.header.flags
+
+    tests = []
+    if args.in_use:
+        tests.append(lambda e: flags(e) & entry.IN_USE)
+    if args.deleted:
+        tests.append(lambda e: not flags(e) & entry.IN_USE)
+    if args.dirs:
+        tests.append(lambda e: flags(e) & entry.DIRECTORY)
+    if args.files:
+        tests.append(lambda e: not flags(e) & entry.DIRECTORY)
+    if args.name:
+        pattern = args.name.lower()
+        tests.append(lambda e: fnmatch.fnmatchcase(
+            (name(e) or '').lower(), pattern))
+    if not tests:
+        return None
+    return lambda e: all(test(e) for test in tests)
+
+
+def report(partition, elapsed, written=None, out=sys.stderr):
+    """
+    Prints the throughput and record counts of a scan
+    """
+    stats = partition.stats
+    records = stats.get('records', 0)
+    megabytes = stats.get('bytes_read', 0) / 1024.0 / 1024.0
+    elapsed = max(elapsed, 1e-9)
+    line = '{0} records in {1:.2f} s, {2:.0f} records/s, {3:.1f} MB/s'
+    line = line.format(records, elapsed, records / elapsed,
+                       megabytes / elapsed)
+    if written is not None:
+        line += ', {0} entries written'.format(written)
+    line += '; bad {0}, zero {1}, unused {2}, torn {3}'.format(
+        stats.get('bad', 0), stats.get('zero', 0), stats.get('unused', 0),
+        stats.get('torn', 0))
+    if stats.get('missing'):
+        line += '; {0} entries past the end of the MFT runlist were not ' \
+                'read'.format(stats['missing'])
+    out.write(line + '\n')
+    out.flush()
+
+
+def progress(entries, partition, interval, start):
+    """
+    Passes entries through and reports every interval seconds
+    """
+    due = start + interval
+    for e in entries:
+        yield e
+        now = time.time()
+        if now >= due:
+            report(partition, now - start)
+            due = now + interval
+
+
+def scan(args, parser):
+    fields = export.DEFAULT_FIELDS
+    if args.fields:
+        fields = [name.strip() for name in args.fields.split(',')]
+    if args.workers > 1 and args.format in ENTRY_FORMATS:
+        raise SystemExit(
+            "The {0} format needs --workers 1".format(args.format))
+    if args.output == '-' and args.format in ('parquet', 'arrow'):
+        raise SystemExit("The {0} format needs --output".format(args.format))
+
+    try:
+        partition = entry.Partition(
+            args.image, chunk_size=args.chunk_size, use_mmap=args.mmap)
+    except (OSError, ValidationError) as e:
+        raise SystemExit("Can't read {0}: {1}".format(args.image, e))
+    # The record size is only known from the boot sector
+    if args.chunk_size < partition.record_size:
+        parser.error("--chunk-size must be at least the record size, "
+                     "{0} bytes".format(partition.record_size))
+    # Paths need every directory, whatever range is scanned
+    resolver = None
+    if args.paths:
+        resolver = paths.PathResolver.from_partition(partition)
+    if args.ranges:
+        extents = []
+        for first, end in merge_ranges(args.ranges):
+            extents.extend(reader.select(
+                partition.extents, partition.record_size, first, end))
+        partition.extents = extents
+    if args.format in ('csv', 'jsonl'):
+        try:
+            for name in fields:
+                export.getter(name, resolver)
+        except ValueError as e:
+            raise SystemExit(str(e))
+
+    start = time.time()
+    if args.workers > 1:
+        entries = (summary for batch in parallel.scan(
+            partition, workers=args.workers, ordered=True)
+            for summary in batch)
+    else:
+        entries = partition.walk()
+    if args.progress:
+        entries = progress(entries, partition, args.progress, start)
+    test = make_filter(args)
+    if test is not None:
+        entries = (e for e in entries if test(e))
+
+    if args.format == 'none':
+        written = sum(1 for _ in entries)
+    elif args.format in ('parquet', 'arrow'):
+        import arrow
+        write = arrow.write_parquet if args.format == 'parquet' \
+            else arrow.write_ipc
+        written = write(entries, args.output, partition.attribute_types)
+    elif args.output == '-':
+        written = export.WRITERS[args.format](
+            entries, sys.stdout, fields, resolver)
+        sys.stdout.flush()
+    else:
+        written = export.export(
+            entries, args.output, args.format, fields, resolver=resolver)
+    report(partition, time.time() - start, written)
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'scan':
+        return scan(args, parser)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
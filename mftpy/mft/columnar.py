@@ -0,0 +1,241 @@
+"""
+Decode many MFT entries at once into NumPy column arrays
+
+Entry builds Python objects for every field of every record. For analytics
+only a handful of values per record are needed, so decode() works on a
+whole buffer of records at once. The fixed header is read through a
+structured dtype, the fixup arrays are applied to all records together, and
+the attribute lists are walked one step at a time for all records in
+parallel to pick up the $STANDARD_INFORMATION and $FILE_NAME values.
+
+Usage:
+
+    p = entry.Partition('/dev/sda1')
+    for columns in columnar.scan(p):
+        in_use = columns['flags'] & 1 == 1
+        print(columns['record_number'][in_use])
+
+NumPy is only needed for this module.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import entry
+import reader
+from fields import UNIX_EPOCH_AS_FILETIME
+from utils import FIXUP_STRIDE
+
+# How many attributes to look at per record before giving up on finding
+# $STANDARD_INFORMATION and $FILE_NAME
+MAX_ATTRIBUTES = 16
+
+# Offsets of the header fields, see Table 13.1 on page 353
+HEADER_FIELDS = [
+    ('signature', '<u4', 0),
+    ('fixup_array_offset', '<u2', 4),
+    ('fixup_array_entries', '<u2', 6),
+    ('lsn', '<u8', 8),
+    ('sequence', '<u2', 16),
+    ('link_count', '<u2', 18),
+    ('attribute_offset', '<u2', 20),
+    ('flags', '<u2', 22),
+    ('used_size', '<u4', 24),
+    ('allocated_size', '<u4', 28),
+    ('base_ref', '<u8', 32),
+    ('next_attr_id', '<u2', 40),
+]
+
+# Columns taken from the attributes. Timestamps are raw FILETIME values.
+SI_TIMES = ['si_created', 'si_altered', 'si_mft_altered', 'si_accessed']
+FN_TIMES = ['fn_created', 'fn_altered', 'fn_mft_altered', 'fn_accessed']
+
+_header_dtypes = {}
+
+
+def require_numpy():
+    if numpy is None:
+        raise ImportError("NumPy is required for columnar decoding")
+
+
+def header_dtype(record_size):
+    """
+    Returns a structured dtype that lays the header fields over a record of
+    record_size bytes
+    """
+    require_numpy()
+    try:
+        return _header_dtypes[record_size]
+    except KeyError:
+        dtype = numpy.dtype({
+            'names': [name for name, _, _ in HEADER_FIELDS],
+            'formats': [fmt for _, fmt, _ in HEADER_FIELDS],
+            'offsets': [offset for _, _, offset in HEADER_FIELDS],
+            'itemsize': record_size,
+        })
+        _header_dtypes[record_size] = dtype
+        return dtype
+
+
+def gather(data, positions, dtype):
+    """
+    Reads one little-endian value of dtype from each position of the flat
+    uint8 array data
+    """
+    dtype = numpy.dtype(dtype)
+    index = positions[:, None] + numpy.arange(dtype.itemsize)
+    return numpy.ascontiguousarray(data[index]).view(dtype).ravel()
+
+
+def apply_fixups(data, header, record_size):
+    """
+    Applies the fixup arrays of all records in place. data is the flat
+    uint8 array of the records. Returns a boolean array that marks the torn
+    records.
+    """
+    count = len(header)
+    sectors = record_size // FIXUP_STRIDE
+    base = numpy.arange(count, dtype=numpy.int64) * record_size
+    usa = header['fixup_array_offset'].astype(numpy.int64)
+    valid = ((header['signature'] == entry.FILE_SIGNATURE) &
+             (header['fixup_array_entries'] == sectors + 1) &
+             (usa + 2 * (sectors + 1) <= record_size))
+    torn = numpy.zeros(count, dtype=bool)
+    base = base[valid]
+    usa = base + usa[valid]
+    for i in range(1, sectors + 1):
+        end = base + i * FIXUP_STRIDE - 2
+        match = (data[end] == data[usa]) & (data[end + 1] == data[usa + 1])
+        torn[numpy.flatnonzero(valid)[~match]] = True
+        data[end[match]] = data[usa[match] + 2 * i]
+        data[end[match] + 1] = data[usa[match] + 2 * i + 1]
+    return torn
+
+
+def decode(buf, record_size=reader.RECORD_SIZE, first_record=0,
+           names=False):
+    """
+    Decodes a buffer of whole MFT records into a dictionary of column
+    arrays, one value per record.
+
+    The header columns are named after the header fields, with base_ref for
+    the file reference of the base record. `torn` marks records that
+    failed the fixup check. The SI_TIMES and FN_TIMES columns, fn_parent_ref
+    and fn_name_length come from the first $STANDARD_INFORMATION and
+    $FILE_NAME attributes, and are zero where the record has none.
+    fn_name_offset is the position of the name in the buffer, or -1.
+
+    With names=True a `filename` column of strings is added.
+    """
+    require_numpy()
+    count = len(buf) // record_size
+    # One writable copy of the buffer for the fixups
+    data = numpy.frombuffer(buf, dtype=numpy.uint8,
+                            count=count * record_size).copy()
+    header = data.view(header_dtype(record_size))
+    columns = {'record_number': numpy.arange(
+        first_record, first_record + count, dtype=numpy.int64)}
+    for name, _, _ in HEADER_FIELDS:
+        columns[name] = header[name].copy()
+    columns['torn'] = apply_fixups(data, header, record_size)
+
+    for name in SI_TIMES + FN_TIMES + ['fn_parent_ref']:
+        columns[name] = numpy.zeros(count, dtype=numpy.uint64)
+    columns['fn_name_length'] = numpy.zeros(count, dtype=numpy.uint8)
+    columns['fn_name_offset'] = numpy.full(count, -1, dtype=numpy.int64)
+
+    # Walk the attribute lists of all records in lock step
+    rows = numpy.flatnonzero(header['signature'] == entry.FILE_SIGNATURE)
+    offset = header['attribute_offset'][rows].astype(numpy.int64)
+    have_si = numpy.zeros(count, dtype=bool)
+    have_fn = numpy.zeros(count, dtype=bool)
+    for _ in range(MAX_ATTRIBUTES):
+        keep = offset + 24 <= record_size
+        rows, offset = rows[keep], offset[keep]
+        if not len(rows):
+            break
+        pos = rows * record_size + offset
+        attr_type = gather(data, pos, '<u4')
+        length = gather(data, pos + 4, '<u4').astype(numpy.int64)
+        resident = data[pos + 8] == 0
+        content = offset + gather(data, pos + 20, '<u2')
+        content_size = gather(data, pos + 16, '<u4')
+
+        found = (resident & (attr_type == 16) & ~have_si[rows] &
+                 (content_size >= 32) & (content + 32 <= record_size))
+        si_rows = rows[found]
+        start = si_rows * record_size + content[found]
+        for i, name in enumerate(SI_TIMES):
+            columns[name][si_rows] = gather(data, start + 8 * i, '<u8')
+        have_si[si_rows] = True
+
+        found = (resident & (attr_type == 48) & ~have_fn[rows] &
+                 (content_size >= 66) & (content + 66 <= record_size))
+        fn_rows = rows[found]
+        start = fn_rows * record_size + content[found]
+        columns['fn_parent_ref'][fn_rows] = gather(data, start, '<u8')
+        for i, name in enumerate(FN_TIMES):
+            columns[name][fn_rows] = gather(data, start + 8 + 8 * i, '<u8')
+        columns['fn_name_length'][fn_rows] = data[start + 64]
+        columns['fn_name_offset'][fn_rows] = start + 66
+        have_fn[fn_rows] = True
+
+        # Stop at the end marker and on broken lengths
+        keep = (attr_type != 0xffffffff) & (length > 0)
+        rows, offset = rows[keep], offset[keep] + length[keep]
+
+    if names:
+        raw = data.tobytes()
+        filename = numpy.empty(count, dtype=object)
+        for i, (start, length) in enumerate(zip(
+                columns['fn_name_offset'].tolist(),
+                columns['fn_name_length'].tolist())):
+            if start >= 0:
+                filename[i] = raw[start:start + 2 * length].decode(
+                    'utf-16-le', 'replace')
+        columns['filename'] = filename
+    return columns
+
+
+def to_datetime64(filetimes):
+    """
+    Converts an array of FILETIME values to datetime64[ns]. Zero and values
+    outside the range of datetime64[ns], 1678 to 2262, become NaT.
+    """
+    require_numpy()
+    filetimes = numpy.asarray(filetimes, dtype=numpy.uint64)
+    limit = numpy.iinfo(numpy.int64).max // 100
+    valid = ((filetimes != 0) &
+             (filetimes >= UNIX_EPOCH_AS_FILETIME - limit) &
+             (filetimes <= UNIX_EPOCH_AS_FILETIME + limit))
+    nanoseconds = numpy.where(
+        valid, filetimes, UNIX_EPOCH_AS_FILETIME).astype(numpy.int64)
+    nanoseconds = (nanoseconds - UNIX_EPOCH_AS_FILETIME) * 100
+    result = nanoseconds.view('datetime64[ns]')
+    result[~valid] = numpy.datetime64('NaT')
+    return result
+
+
+def scan(partition, stats=None):
+    """
+    Reads the MFT of a Partition chunk by chunk and yields the decoded
+    columns of each chunk. The read statistics go into stats, a dict, if it
+    is given and replace partition.stats otherwise, as in Partition.walk.
+    """
+    require_numpy()
+    with open(partition.pn, 'rb') as image:
+        records = reader.MftReader(
+            image, partition.extents, record_size=partition.record_size,
+            chunk_size=partition.chunk_size)
+        stats = partition.scan_stats(stats)
+        stats.update(records.stats)
+        records.stats = stats
+        for extent in records.extents:
+            record = extent.record
+            for chunk in records.chunks(extent):
+                columns = decode(chunk, partition.record_size, record)
+                record += len(columns['record_number'])
+                stats['records'] += len(columns['record_number'])
+                yield columns
@@ -1,30 +1,140 @@
-from utils import byte_range as br
 import fields
+from fields import LazyField
+from utils import apply_fixups
 import attributes
 import meta
+import reader
+import runlist
 from exceptions import ValidationError
+import io
+import os
 import struct
+from collections import namedtuple
+
+
+# Signature of an entry in use ("FILE")
+FILE_SIGNATURE = 0x454c4946
+# Signatures of a record with an error ("BAAD") and of an unused record
+BAD_SIGNATURE = b'BAAD'
+ZERO_SIGNATURE = b'\x00\x00\x00\x00'
+
+# Entry flags, see fields.MftFlagsField
+IN_USE = 0x0001
+DIRECTORY = 0x0002
+
+# A file reference holds the entry number in the low 48 bits and the
+# sequence number in the high 16 bits
+REFERENCE_MASK = 0xffffffffffff
+
+# $FILE_NAME namespace of the DOS 8.3 name
+DOS_NAMESPACE = 2
+
+# Entry numbers of $Volume, which holds the NTFS version, and $AttrDef
+VOLUME_RECORD = 3
+ATTRDEF_RECORD = 4
+
+# Entry number of the root directory
+ROOT = 5
+
+# Table 13.1 on page 353, decoded with a single call
+HEADER = struct.Struct('<LHHQHHHHLLQH')
+
+EntryHeader = namedtuple('EntryHeader', [
+    'signature', 'fixup_array_offset', 'fixup_array_entries', 'lsn',
+    'sequence', 'link_count', 'attribute_offset', 'flags', 'used_size',
+    'allocated_size', 'file_ref', 'next_attr_id'])
+
+
+# A compact, picklable record of an entry, see Entry.summary
+Summary = namedtuple('Summary', [
+    'record_number', 'sequence', 'flags', 'link_count', 'lsn',
+    'base_ref', 'parent_ref', 'filename', 'torn'])
 
 
 class Entry(object):
     """
     Creates a python object from an MFT entry
+
+    Nothing is decoded up front. The header is decoded into `header` the
+    first time it is needed, and the field objects below are built from the
+    same bytes when they are first read. Both are kept for later reads.
+
+    `raw` is the entry as it is stored on disk. Everything past the header
+    is read from `view`, a copy with the fixup array applied. `types` is the
+    attribute type table of the volume, see attributes.type_table.
     """
-    def __init__(self, data):
+    __slots__ = (
+        'raw', 'record_number', 'types', '_view', '_torn', '_header',
+        '_attributes', '_attributes_by_type',
+        '_signature', '_fixup_array_offset', '_fixup_array_entries', '_lsn',
+        '_sequence', '_link_count', '_attribute_offset', '_flags',
+        '_used_size', '_allocated_size', '_file_ref', '_next_attr_id',
+    )
+
+    signature = LazyField(fields.StringField, 0, 3)
+    fixup_array_offset = LazyField(fields.BaseField, 4, 5)
+    fixup_array_entries = LazyField(fields.BaseField, 6, 7)
+    lsn = LazyField(fields.BaseField, 8, 15)
+    sequence = LazyField(fields.BaseField, 16, 17)
+    link_count = LazyField(fields.BaseField, 18, 19)
+    attribute_offset = LazyField(fields.BaseField, 20, 21)
+    flags = LazyField(fields.MftFlagsField, 22, 23)
+    used_size = LazyField(fields.BaseField, 24, 27)
+    allocated_size = LazyField(fields.BaseField, 28, 31)
+    file_ref = LazyField(fields.BaseField, 32, 39)
+    next_attr_id = LazyField(fields.BaseField, 40, 41)
+
+    def __init__(self, data, record_number=None,
+                 types=attributes.DEFAULT_TYPES):
         self.raw = data
-        self.signature = fields.StringField(br(data, 0, 3))
-        self.fixup_array_offset = fields.BaseField(br(data, 4, 5))
-        self.fixup_array_entries = fields.BaseField(br(data, 6, 7))
-        self.lsn = fields.BaseField(br(data, 8, 15))
-        self.sequence = fields.BaseField(br(data, 16, 17))
-        self.link_count = fields.BaseField(br(data, 18, 19))
-        self.attribute_offset = fields.BaseField(br(data, 20, 21))
-        self.flags = fields.MftFlagsField(br(data, 22, 23))
-        self.used_size = fields.BaseField(br(data, 24, 27))
-        self.allocated_size = fields.BaseField(br(data, 28, 31))
-        self.file_ref = fields.BaseField(br(data, 32, 39))
-        self.next_attr_id = fields.BaseField(br(data, 40, 41))
-        self.attributes_and_fixups = data[42:]
+        # Position of the entry in the MFT, if known
+        self.record_number = record_number
+        self.types = types
+
+    @property
+    def view(self):
+        """
+        A memoryview of the entry with the fixup array applied
+        """
+        try:
+            return self._view
+        except AttributeError:
+            pass
+        header = self.header
+        if header.signature == FILE_SIGNATURE and header.fixup_array_entries:
+            data, complete = apply_fixups(
+                self.raw, header.fixup_array_offset,
+                header.fixup_array_entries)
+            self._torn = not complete
+        else:
+            data = self.raw
+            self._torn = False
+        self._view = memoryview(data)
+        return self._view
+
+    @property
+    def torn(self):
+        """
+        True if a sector of the entry failed the fixup check. Part of the
+        entry is then from an older or newer write than the rest.
+        """
+        self.view
+        return self._torn
+
+    @property
+    def header(self):
+        """
+        The decoded header as an EntryHeader
+        """
+        try:
+            return self._header
+        except AttributeError:
+            self._header = EntryHeader._make(HEADER.unpack_from(self.raw))
+            return self._header
+
+    @property
+    def attributes_and_fixups(self):
+        return self.view[42:]
 
     def dump(self):
         """
@@ -35,42 +145,116 @@ class Entry(object):
     @property
     def attributes(self):
         """
-        Returns the attributes from the MFT entry as a generator
+        Returns the attributes from the MFT entry as a tuple. They are parsed
+        on first access only.
+        """
+        try:
+            return self._attributes
+        except AttributeError:
+            self._attributes = tuple(self._parse_attributes())
+            return self._attributes
+
+    @property
+    def attributes_by_type(self):
+        """
+        Returns a dictionary of the attributes keyed by type. Each value is a
+        tuple, as a type can occur more than once.
         """
-        data = self.raw[self.attribute_offset.value:]
+        try:
+            return self._attributes_by_type
+        except AttributeError:
+            by_type = {}
+            for attr in self.attributes:
+                by_type.setdefault(attr.header.type, []).append(attr)
+            self._attributes_by_type = dict(
+                (k, tuple(v)) for k, v in by_type.items())
+            return self._attributes_by_type
+
+    def _parse_attributes(self):
+        data = self.view[self.header.attribute_offset:]
         offset = 0
         while True:
             data = data[offset:]
-            attr = attributes.create(data)
+            attr = attributes.create(data, self.types)
             if attr:
                 yield attr
-                offset = attr.attr_length.value
+                offset = attr.header.length
             else:
                 break
-            if attr.attr_type.value == 0xffffffff:
+            # A zero length would parse the same attribute forever
+            if attr.header.type == attributes.END_MARKER or not offset:
                 break
 
+    def file_name(self):
+        """
+        Returns the $FILE_NAME attribute that holds the long name of the
+        entry, or None. The DOS name is only used if there is no other.
+        """
+        best = None
+        for attr in self.attributes_by_type.get(48, ()):
+            if not isinstance(attr, attributes.FileName):
+                continue
+            if best is None or best.namespace.value == DOS_NAMESPACE:
+                best = attr
+        return best
+
     @property
     def filename(self):
-        for attribute in self.attributes:
-            if type(attribute) == attributes.FileName:
-                return attribute.name.value
+        attr = self.file_name()
+        if attr is not None:
+            return attr.name.value
         return "*[No Filename Attribute]*"
 
+    def summary(self):
+        """
+        Returns the header values, the name and the parent reference of the
+        entry as a Summary. The long name is preferred, see file_name.
+        """
+        header = self.header
+        parent_ref = None
+        filename = None
+        attr = self.file_name()
+        if attr is not None:
+            parent_ref = attr.content_value('parent_dir')
+            filename = attr.name.value
+        return Summary(
+            self.record_number, header.sequence, header.flags,
+            header.link_count, header.lsn, header.file_ref, parent_ref,
+            filename, self.torn)
+
     def validate(self):
         """ An MFT entry can have one of the following three values:
             - 0x454c4946 (Good)
             - 0x44414142 (Bad)
             - 0x00000000 (Zero) """
-        if self.signature.unpack() not in [0x454c4946, 0x44414142, 0x00000000]:
+        if self.header.signature not in [FILE_SIGNATURE, 0x44414142, 0x00000000]:
             raise ValidationError("Invalid MFT entry")
 
 
+def power_of_two(n):
+    return n > 0 and not n & (n - 1)
+
+
 class Partition(object):
     """ Stores data about partitions """
-    def __init__(self, partition_name=None):
+    def __init__(self, partition_name=None,
+                 chunk_size=reader.DEFAULT_CHUNK_SIZE, use_mmap=False):
         self.pn = partition_name
         self.offset = None
+        self.serial_number = None
+        self.record_size = reader.RECORD_SIZE
+        self.cluster_size = None
+        # Where the MFT is stored, see reader.Extent
+        self.extents = []
+        self.chunk_size = chunk_size
+        # Map the image instead of reading it
+        self.use_mmap = use_mmap
+        # Read statistics of the last walk
+        self.stats = {}
+        # Attribute types of this volume, see attributes.type_table
+        self.attribute_types = attributes.DEFAULT_TYPES
+        # Entries of the MFT its runlist doesn't reach, see find_extents
+        self.missing = 0
         self.validate()
 
     def validate(self):
@@ -78,31 +262,253 @@ class Partition(object):
             boot = meta.BootFile(partition.read(512))
             if boot.validate():
                 self.offset = boot.get_mft_start_offset()
+                self.serial_number = boot.serial_number[0]
+                self.record_size = boot.get_entry_size()
+                self.cluster_size = boot.get_cluster_size()
+                # A corrupt boot sector can give a size of zero
+                if not (power_of_two(self.record_size) and
+                        power_of_two(self.cluster_size)):
+                    raise ValidationError("Invalid partition")
+                partition.seek(self.offset)
+                self.extents = self.find_extents(
+                    Entry(partition.read(self.record_size)),
+                    self.cluster_size, partition)
+                partition.seek(self.offset + VOLUME_RECORD * self.record_size)
+                self.attribute_types = attributes.types_for_version(
+                    self.find_version(Entry(partition.read(self.record_size))))
             else:
                 raise ValidationError("Invalid partition")
 
-    def walk(self):
+    def find_extents(self, mft, cluster_size, image=None):
+        """
+        Returns the extents of the MFT from the $DATA runlist of its first
+        entry, and of the entries its $ATTRIBUTE_LIST points to if image,
+        the open partition, is given. Falls back to an MFT that runs from
+        its start to the end of the partition if the entry can't be used.
+
+        The number of entries the runlist doesn't reach is kept in
+        `missing` and reported in the stats of every walk.
+        """
+        self.missing = 0
+        runs = runlist.Runlist()
+        size = None
+        try:
+            mft.validate()
+            for attr in self.mft_data(mft, cluster_size, image):
+                if attr.non_resident_header.vcn_start == 0:
+                    size = attr.non_resident_header.actual_size
+                runs.extend(attr.runlist)
+        except (ValidationError, struct.error, ValueError):
+            runs = runlist.Runlist()
+        extents = reader.mft_extents(
+            runs, cluster_size, self.record_size, size)
+        # The first run must be where the boot sector says the MFT is,
+        # otherwise the entry isn't $MFT
+        if not extents or extents[0].offset != self.offset:
+            return reader.contiguous(self.offset)
+        if size is not None:
+            covered = sum(extent.length for extent in extents)
+            self.missing = max(size - covered, 0) // self.record_size
+        return extents
+
+    def mft_data(self, mft, cluster_size, image=None):
+        """
+        Returns the parts of the unnamed $DATA attribute of $MFT in VCN
+        order. The runlist of a very fragmented MFT continues in extension
+        entries listed in its $ATTRIBUTE_LIST, which are read from image.
+        """
+        def unnamed(e):
+            return [attr for attr in e.attributes_by_type.get(128, ())
+                    if attr.non_resident_header is not None and
+                    not attr.header.name_length]
+
+        def order(parts):
+            return sorted(
+                parts, key=lambda attr: attr.non_resident_header.vcn_start)
+
+        parts = order(unnamed(mft))
+        lists = [attr for attr in mft.attributes_by_type.get(32, ())
+                 if isinstance(attr, attributes.AttributeList)]
+        if image is None or not lists:
+            return parts
+        done = set([0])
+        for item in lists[0].entries(image, cluster_size):
+            number = item.file_ref & REFERENCE_MASK
+            if item.type != 128 or item.name_length or number in done:
+                continue
+            done.add(number)
+            # Extension entries are stored in the part of the MFT found so
+            # far
+            runs = runlist.Runlist()
+            for attr in parts:
+                runs.extend(attr.runlist)
+            position = number * self.record_size
+            try:
+                lcn = runs.lookup(position // cluster_size)
+            except IndexError:
+                continue
+            if lcn is None:
+                continue
+            image.seek(lcn * cluster_size + position % cluster_size)
+            e = parse_record(
+                image.read(self.record_size), number, self.attribute_types)
+            if e is None or e.header.file_ref & REFERENCE_MASK != 0:
+                continue
+            parts = order(parts + unnamed(e))
+        return parts
+
+    def mft_size(self):
+        """
+        Returns the size of the MFT in bytes
+        """
+        size = 0
+        for extent in self.extents:
+            length = extent.length
+            if length is None:
+                with open(self.pn, 'rb') as partition:
+                    end = os.lseek(partition.fileno(), 0, os.SEEK_END)
+                length = max(end - extent.offset, 0)
+                length -= length % self.record_size
+            size += length
+        return size
+
+    def find_version(self, volume):
+        """
+        Returns the NTFS version, such as 3.1, from the
+        $VOLUME_INFORMATION attribute of the $Volume entry, or None
+        """
+        try:
+            volume.validate()
+            for attr in volume.attributes_by_type.get(112, ()):
+                if attr.resident_header is not None:
+                    return (attr.vi_major_version.value +
+                            attr.vi_minor_version.value / 10.0)
+        except (ValidationError, struct.error, AttributeError, TypeError):
+            pass
+        return None
+
+    def read_attrdef(self):
+        """
+        Replaces the attribute types of the volume with the ones listed in
+        its $AttrDef file, and returns them
+        """
+        with open(self.pn, 'rb') as partition:
+            partition.seek(self.offset + ATTRDEF_RECORD * self.record_size)
+            attrdef = Entry(partition.read(self.record_size), ATTRDEF_RECORD)
+        attrdef.validate()
+        sink = io.BytesIO()
+        self.extract(attrdef, sink)
+        self.attribute_types = attributes.attrdef_types(sink.getvalue())
+        return self.attribute_types
+
+    def extract(self, entry, sink):
+        """
+        Write the content of the unnamed $DATA attribute of an entry to
+        sink, a file-like object. Returns the number of bytes written.
+        """
+        streams = sorted(
+            (attr for attr in entry.attributes_by_type.get(128, ())
+             if not attr.header.name_length),
+            key=lambda attr: getattr(
+                attr.non_resident_header, 'vcn_start', 0))
+        if not streams:
+            raise ValidationError("Entry has no $DATA attribute")
+        runs = None
+        if len(streams) > 1:
+            runs = runlist.Runlist()
+            for attr in streams:
+                runs.extend(attr.runlist)
+        with open(self.pn, 'rb') as partition:
+            return streams[0].extract(
+                partition, sink, self.cluster_size, self.chunk_size, runs)
+
+    def open_reader(self, partition, extents=None):
+        """
+        Returns a reader for the MFT, or for part of it, of an open
+        partition
+        """
+        if extents is None:
+            extents = self.extents
+        if self.use_mmap:
+            return reader.MmapReader(
+                partition, extents, record_size=self.record_size)
+        return reader.MftReader(
+            partition, extents, record_size=self.record_size,
+            chunk_size=self.chunk_size)
+
+    def scan_stats(self, stats=None):
+        """
+        Returns the dict the read statistics of a scan go into: stats if it
+        is given, otherwise a new dict that replaces the stats of the
+        partition. Walks, parallel.scan and columnar.scan all use it.
+        """
+        if stats is None:
+            stats = self.stats = {}
+        stats['missing'] = self.missing
+        return stats
+
+    def walk(self, stats=None):
+        """
+        Yields the entries of the MFT in the order they are stored on disk.
+        The read statistics of the walk go into stats, a dict, if it is
+        given and replace the stats of the partition otherwise.
+        """
         if self.offset:
             with open(self.pn, 'rb') as partition:
-                while True:
-                    try:
-                        partition.seek(self.offset)
-                        d = partition.read(1024)
-                        e = Entry(d)
-                        self.offset = partition.tell()
-                        #FIXME: Properly handle the validation error
-                        try:
-                            e.validate()
-                        except ValidationError:
-                            pass
-                        else:
-                            # We don't want to show unknown empty entries
-                            if e.filename == '*[No Filename Attribute]*' and e.next_attr_id.value == 0:
-                                pass
-                            else:
-                                yield(e)
-                    except struct.error:
-                        break
+                records = self.open_reader(partition)
+                stats = self.scan_stats(stats)
+                stats.update(records.stats)
+                records.stats = stats
+                try:
+                    for e in parse(records, stats, self.attribute_types):
+                        yield(e)
+                finally:
+                    if self.use_mmap:
+                        records.close()
+
+
+def parse(records, stats, types=attributes.DEFAULT_TYPES):
+    """
+    Yields an Entry for each (entry number, data) pair from a reader,
+    skipping invalid and unused entries. types is the attribute type table
+    of the volume.
+
+    Records marked bad, records without a signature, torn entries and
+    entries that are not in use are counted in stats.
+    """
+    for key in ('torn', 'bad', 'zero', 'unused'):
+        stats[key] = 0
+    for number, d in records:
+        signature = bytes(d[:4])
+        if signature == BAD_SIGNATURE:
+            stats['bad'] += 1
+        elif signature == ZERO_SIGNATURE:
+            stats['zero'] += 1
+        e = parse_record(d, number, types)
+        if e is None:
+            continue
+        if e.torn:
+            stats['torn'] += 1
+        if not e.header.flags & IN_USE:
+            stats['unused'] += 1
+        yield(e)
+
+
+def parse_record(data, record_number=None, types=attributes.DEFAULT_TYPES):
+    """
+    Returns the Entry of a single record, or None if the record is invalid
+    or unused
+    """
+    try:
+        e = Entry(data, record_number, types)
+        #FIXME: Properly handle the validation error
+        e.validate()
+        # We don't want to show unknown empty entries
+        if e.filename == '*[No Filename Attribute]*' and e.header.next_attr_id == 0:
+            return None
+    except (ValidationError, struct.error):
+        return None
+    return e
 
 
 def gimme():
@@ -0,0 +1,300 @@
+"""
+Write the entries of a walk to CSV, JSON Lines or a bodyfile
+
+The writers take any iterable of entries, such as Partition.walk(), and
+write one line per entry as it comes, so memory use doesn't grow with the
+size of the MFT. entry.Summary tuples, from parallel.scan() or the cache,
+work as well for the fields a summary has.
+
+Usage:
+
+    p = entry.Partition('/dev/sda1')
+    export.export(p.walk(), 'entries.csv.gz', fields=['record_number',
+                  'filename', 'si_created'])
+
+The bodyfile format is the one of the Sleuth Kit's fls -m, for mactime.
+Timestamps are written as ISO 8601 in UTC to CSV and JSON Lines, and as
+Unix time to a bodyfile.
+
+Output ending in .gz is compressed with gzip and output ending in .zst with
+zstd, for which the zstandard package is needed.
+"""
+
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+import entry
+from fields import FILETIME_EPOCH, UNIX_EPOCH_AS_FILETIME
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Size of the write buffer
+BUFFER_SIZE = 1024 * 1024
+
+
+def standard_info(e):
+    for attr in e.attributes_by_type.get(16, ()):
+        if attr.resident_header is not None:
+            return attr
+
+
+def content_value(attr, name):
+    """
+    Returns a number from the content of an attribute, unpacked with the
+    layout of its class, or None if the content is too short
+    """
+    if attr is not None:
+        return attr.content_value(name)
+
+
+def data_size(e):
+    """
+    Returns the size of the unnamed $DATA attribute of an entry, or None
+    """
+    for attr in e.attributes_by_type.get(128, ()):
+        if attr.header.name_length:
+            continue
+        if attr.non_resident_header is not None:
+            if attr.non_resident_header.vcn_start == 0:
+                return attr.non_resident_header.actual_size
+        else:
+            return attr.resident_header.content_size
+
+
+def header_getter(name):
+    return lambda e: getattr(e.header, name)
+
+
+def si_getter(name):
+    return lambda e: content_value(standard_info(e), name)
+
+
+def fn_getter(name):
+    return lambda e: content_value(e.file_name(), name)
+
+
+def file_name(e):
+    attr = e.file_name()
+    if attr is not None:
+        return attr.name.value
+
+
+# How each field is read from an Entry
+GETTERS = {
+    'record_number': lambda e: e.record_number,
+    'sequence': header_getter('sequence'),
+    'flags': header_getter('flags'),
+    'in_use': lambda e: bool(e.header.flags & entry.IN_USE),
+    'directory': lambda e: bool(e.header.flags & entry.DIRECTORY),
+    'link_count': header_getter('link_count'),
+    'lsn': header_getter('lsn'),
+    'base_ref': header_getter('file_ref'),
+    'parent_ref': fn_getter('parent_dir'),
+    'filename': file_name,
+    'size': data_size,
+    'si_created': si_getter('created'),
+    'si_altered': si_getter('altered'),
+    'si_mft_altered': si_getter('mft_altered'),
+    'si_accessed': si_getter('accessed'),
+    'si_flags': si_getter('si_flags'),
+    'fn_created': fn_getter('file_creation_time'),
+    'fn_altered': fn_getter('file_modification_time'),
+    'fn_mft_altered': fn_getter('mft_modification_time'),
+    'fn_accessed': fn_getter('file_access_time'),
+    'torn': lambda e: e.torn,
+}
+
+# Fields that hold a FILETIME
+TIME_FIELDS = frozenset([
+    'si_created', 'si_altered', 'si_mft_altered', 'si_accessed',
+    'fn_created', 'fn_altered', 'fn_mft_altered', 'fn_accessed'])
+
+DEFAULT_FIELDS = [
+    'record_number', 'sequence', 'in_use', 'directory', 'link_count',
+    'lsn', 'base_ref', 'parent_ref', 'filename', 'size',
+    'si_created', 'si_altered', 'si_mft_altered', 'si_accessed',
+    'fn_created', 'fn_altered', 'fn_mft_altered', 'fn_accessed', 'torn']
+
+
+def summary_value(summary, name):
+    if name == 'in_use':
+        return bool(summary.flags & entry.IN_USE)
+    if name == 'directory':
+        return bool(summary.flags & entry.DIRECTORY)
+    return getattr(summary, name, None)
+
+
+def getter(name, resolver=None):
+    """
+    Returns a function that reads the field name from an Entry or an
+    entry.Summary. The 'path' field needs a paths.PathResolver.
+    """
+    if name == 'path':
+        if resolver is None:
+            raise ValueError("The path field needs a path resolver")
+        return lambda e: resolver.path(e.record_number) \
+            if e.record_number in resolver else None
+    if name not in GETTERS:
+        raise ValueError("Unknown field {0}".format(name))
+    read = GETTERS[name]
+
+    def get(e):
+        if isinstance(e, entry.Summary):
+            return summary_value(e, name)
+        try:
+            return read(e)
+        except (AttributeError, IndexError, TypeError):
+            return None
+    return get
+
+
+def iso_time(filetime):
+    """
+    Returns a FILETIME as an ISO 8601 string, or '' if it is zero or out of
+    range
+    """
+    if not filetime:
+        return ''
+    try:
+        return (FILETIME_EPOCH + timedelta(microseconds=filetime // 10)
+                ).isoformat() + 'Z'
+    except OverflowError:
+        return ''
+
+
+def unix_time(filetime):
+    """
+    Returns a FILETIME as whole seconds since 1970, or 0
+    """
+    if not filetime:
+        return 0
+    return max((filetime - UNIX_EPOCH_AS_FILETIME) // 10000000, 0)
+
+
+def rows(entries, fields, resolver=None):
+    """
+    Yields a list of values for each entry, with the timestamps as ISO 8601
+    strings
+    """
+    getters = [getter(name, resolver) for name in fields]
+    times = [name in TIME_FIELDS for name in fields]
+    for e in entries:
+        row = [get(e) for get in getters]
+        for i, is_time in enumerate(times):
+            if is_time:
+                row[i] = iso_time(row[i])
+        yield row
+
+
+def write_csv(entries, sink, fields=DEFAULT_FIELDS, resolver=None):
+    """
+    Writes the fields of entries to sink, a text file, as CSV with a header
+    line. Returns the number of entries.
+    """
+    writer = csv.writer(sink)
+    writer.writerow(fields)
+    count = 0
+    for row in rows(entries, fields, resolver):
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(entries, sink, fields=DEFAULT_FIELDS, resolver=None):
+    """
+    Writes the fields of entries to sink, a text file, as one JSON object
+    per line. Returns the number of entries.
+    """
+    count = 0
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    for row in rows(entries, fields, resolver):
+        sink.write(encode(dict(zip(fields, row))))
+        sink.write('\n')
+        count += 1
+    return count
+
+
+def write_bodyfile(entries, sink, fields=None, resolver=None):
+    """
+    Writes entries to sink, a text file, in the Sleuth Kit bodyfile format.
+    Every entry gets a line with its $STANDARD_INFORMATION times and one
+    with its $FILE_NAME times. Names are full paths if a resolver is given.
+    fields is ignored, the format is fixed. Returns the number of entries.
+    """
+    name = getter('path' if resolver else 'filename', resolver)
+    get = dict((field, getter(field)) for field in DEFAULT_FIELDS)
+    count = 0
+    for e in entries:
+        path = name(e)
+        if path is None:
+            continue
+        path = path.replace('|', '\\|')
+        number = get['record_number'](e)
+        if get['directory'](e):
+            mode = 'd/drwxrwxrwx'
+        else:
+            mode = 'r/rrwxrwxrwx'
+        size = get['size'](e) or 0
+        for prefix, suffix in (('si_', ''), ('fn_', ' ($FILE_NAME)')):
+            times = [get[prefix + t](e) for t in
+                     ('accessed', 'altered', 'mft_altered', 'created')]
+            if not any(times):
+                continue
+            sink.write('0|{0}{1}|{2}|{3}|0|0|{4}|{5}|{6}|{7}|{8}\n'.format(
+                path, suffix, number, mode, size,
+                *[unix_time(t) for t in times]))
+        count += 1
+    return count
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'bodyfile': write_bodyfile,
+}
+
+
+def open_output(path, compression=None):
+    """
+    Opens path for writing text. compression is None, 'gzip' or 'zstd', or
+    taken from the extension of path if it is 'auto'.
+    """
+    if compression == 'auto':
+        if path.endswith('.gz'):
+            compression = 'gzip'
+        elif path.endswith('.zst'):
+            compression = 'zstd'
+        else:
+            compression = None
+    if compression is None:
+        return open(path, 'w', newline='', encoding='utf-8',
+                    buffering=BUFFER_SIZE)
+    if compression == 'gzip':
+        raw = gzip.open(path, 'wb', compresslevel=6)
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("The zstandard package is needed for zstd")
+        raw = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+    else:
+        raise ValueError("Unknown compression {0}".format(compression))
+    return io.TextIOWrapper(
+        io.BufferedWriter(raw, BUFFER_SIZE), encoding='utf-8', newline='')
+
+
+def export(entries, path, fmt='csv', fields=None, compression='auto',
+           resolver=None):
+    """
+    Writes entries to the file path in the format fmt, one of WRITERS.
+    Returns the number of entries written.
+    """
+    try:
+        write = WRITERS[fmt]
+    except KeyError:
+        raise ValueError("Unknown format {0}".format(fmt))
+    with open_output(path, compression) as sink:
+        return write(entries, sink, fields or DEFAULT_FIELDS, resolver)
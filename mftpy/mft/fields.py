@@ -1,7 +1,6 @@
 import struct
-from datetime import datetime
+from datetime import datetime, timedelta
 import binascii
-from attributes import get_attribute_type
 
 
 format_options = {
@@ -13,6 +12,15 @@ format_options = {
 }
 
 
+# Windows timestamps (FILETIME) count 100 nanosecond intervals since 1601
+FILETIME_EPOCH = datetime(1601, 1, 1)
+# The Unix epoch as a FILETIME
+UNIX_EPOCH_AS_FILETIME = 116444736000000000
+
+# Marks a LazyField that runs to the end of its source
+END = -1
+
+
 class MftValueError(ValueError):
     """
     A basic value error
@@ -23,7 +31,13 @@ class MftValueError(ValueError):
 class BaseField(object):
     """
     The base field. Other fields will be built on top of this field.
+
+    The decoded value and the hex string are computed on first read and
+    kept in slots. Subclasses change the value by overriding decode() and
+    declare empty __slots__ to stay as small as this class. When the owner
+    already unpacked the number, it is handed over in _unpacked.
     """
+    __slots__ = ('validate', 'raw', 'verbose', '_value', '_hex', '_unpacked')
 
     def __init__(self, data, validate=False, verbose=None):
         self.validate = validate
@@ -39,6 +53,16 @@ class BaseField(object):
 
     @property
     def value(self):
+        """
+        The decoded value
+        """
+        try:
+            return self._value
+        except AttributeError:
+            self._value = self.decode()
+            return self._value
+
+    def decode(self):
         """
         Override this function to change the returned value
         """
@@ -47,10 +71,16 @@ class BaseField(object):
 
     @property
     def hex(self):
+        try:
+            return self._hex
+        except AttributeError:
+            pass
         if type(self.raw) == int:
-            return hex(self.raw)
+            self._hex = hex(self.raw)
         else:
-            return "0x{0}".format(binascii.hexlify(self.raw).decode('utf-8'))
+            self._hex = "0x{0}".format(
+                binascii.hexlify(self.raw).decode('utf-8'))
+        return self._hex
 
     def __repr__(self):
         return '{0} ({1})'.format(self.value, self.hex)
@@ -59,6 +89,10 @@ class BaseField(object):
         """
         Unpack the raw data
         """
+        try:
+            return self._unpacked
+        except AttributeError:
+            pass
         if type(self.raw) == int:
             return self.raw
         else:
@@ -69,6 +103,7 @@ class SiFlagsField(BaseField):
     """
     Returns the correct value for standard information attributes
     """
+    __slots__ = ()
 
     # Flag values found on page 360-361
     SI_FLAGS = {
@@ -87,20 +122,18 @@ class SiFlagsField(BaseField):
         0x4000: 'Encrypted',
     }
 
-    @property
-    def value(self):
-        try:
-            return self.SI_FLAGS[self.unpack()]
-        except KeyError:
-            return self.unpack()
+    def decode(self):
+        flags = self.unpack()
+        return self.SI_FLAGS.get(flags, flags)
 
 
 class StringField(BaseField):
     """
     Used for holding string values
     """
-    @property
-    def value(self):
+    __slots__ = ()
+
+    def decode(self):
         return str(self.raw, 'utf-8')
 
 
@@ -108,40 +141,40 @@ class FileNameField(BaseField):
     """
     Used for filename values
     """
-    @property
-    def value(self):
+    __slots__ = ()
+
+    def decode(self):
+        raw = bytes(self.raw)
         try:
-            return self.raw.decode('utf-8').replace("\x00", "")
+            return raw.decode('utf-8').replace("\x00", "")
         except UnicodeDecodeError:
             try:
-                return self.raw.decode('utf-16').replace("\x00", "")
+                return raw.decode('utf-16').replace("\x00", "")
             except UnicodeDecodeError:
                 try:
-                    return self.raw.decode('utf-32').replace('\x00', '')
+                    return raw.decode('utf-32').replace('\x00', '')
                 except UnicodeDecodeError:
-                    return self.raw
+                    return raw
 
 
 class MftFlagsField(BaseField):
     """
     Stores the MFT Flags
     """
-    @property
-    def value(self):
+    __slots__ = ()
+
+    FLAG_CHOICES = {
+        0x01: 'In use',
+        0x02: 'Directory',
+        }
+
+    def decode(self):
         """
         Unpack the data
         """
-        flag_choices = {
-            0x01: 'In use',
-            0x02: 'Directory',
-            }
-
         if self.raw:
             flags = self.unpack()
-            try:
-                return flag_choices[flags]
-            except KeyError:
-                return flags
+            return self.FLAG_CHOICES.get(flags, flags)
 
 
 class NonResField(BaseField):
@@ -149,8 +182,9 @@ class NonResField(BaseField):
     Stores the non resident flag. If the value is True (1) then the attr
     is non resident.
     """
-    @property
-    def value(self):
+    __slots__ = ()
+
+    def decode(self):
         return self.unpack() == 1
 
 
@@ -159,7 +193,13 @@ class WindowsTimeField(BaseField):
     Stores time in Windows format.
     The formula to convert time was found at
     http://code.activestate.com/recipes/303344-converting-windows-64-bit-time-to-python-useable-f/
+
+    filetime is the exact timestamp and datetime the timestamp to the
+    microsecond. value is formatted with time_format.
     """
+    __slots__ = ()
+
+    time_format = "%Y/%m/%d %H:%M"
 
     def unpack(self):
         """
@@ -168,16 +208,26 @@ class WindowsTimeField(BaseField):
         return struct.unpack("<LL", self.raw)
 
     @property
-    def value(self):
-        low, high = self.unpack()
-        # difference between 1601 and 1970
-        d = 116444736000000000
-        val = (((int(high) << 32) + int(low)) - d) / 10000000
+    def filetime(self):
+        """
+        The timestamp as an integer of 100 nanosecond intervals since 1601
+        """
+        try:
+            return self._unpacked
+        except AttributeError:
+            return struct.unpack("<Q", self.raw)[0]
+
+    @property
+    def datetime(self):
+        """
+        The timestamp as a datetime
+        """
+        return FILETIME_EPOCH + timedelta(microseconds=self.filetime // 10)
+
+    def decode(self):
         try:
-            dt = datetime.utcfromtimestamp(val)
-            self.datetime = dt
-            return dt.strftime("%Y/%m/%d %H:%M")
-        except ValueError:
+            return self.datetime.strftime(self.time_format)
+        except (ValueError, OverflowError):
             return "Invalid date and time"
 
 
@@ -185,6 +235,8 @@ class ParentDirField(BaseField):
     """
     Stores information about the file reference of the parent directory
     """
+    __slots__ = ()
+
     # Solution found here:
     #   http://stackoverflow.com/questions/7949912/how-to-unpack-6-bytes-as-single-integer-using-struct-in-python
     # More can be found here:
@@ -196,8 +248,7 @@ class ParentDirField(BaseField):
         x1, x2, x3 = struct.unpack('<HHI', self.raw)
         return x1, x2 | (x3 >> 16)
 
-    @property
-    def value(self):
+    def decode(self):
         return self.unpack()
 
     def __repr__(self):
@@ -206,11 +257,131 @@ class ParentDirField(BaseField):
 
 class AttributeTypeField(BaseField):
     """
-    Returns information about the AttributeType
+    Returns information about the AttributeType, named from the type table
+    of the volume
     """
-    @property
-    def value(self):
-        return get_attribute_type(self.unpack())[0]
+    __slots__ = ('types',)
+
+    def __init__(self, data, validate=False, verbose=None, types=None):
+        super().__init__(data, validate, verbose)
+        self.types = types
+
+    def decode(self):
+        from attributes import get_attribute_type
+        return get_attribute_type(self.unpack(), types=self.types)[0]
 
     def id(self):
         return self.unpack()
+
+
+class LazyField(object):
+    """
+    Declares a field of an entry or attribute at a byte range of one of its
+    buffers. The range is inclusive, like utils.byte_range.
+
+    The field object is only built the first time it is read. It wraps a
+    memoryview of the buffer, so no bytes are copied. A field can depend on
+    another attribute of its owner with `when`. It is missing while that
+    attribute is None. The attribute of the owner named by `context` is
+    passed to the field class as a keyword argument of the same name.
+
+    Built fields are cached in the instance dictionary or, for owners with
+    __slots__, in a slot named after the field with a leading underscore.
+    """
+    def __init__(self, field_class, start, end=None, verbose=None,
+                 source='view', when=None, context=None):
+        self.field_class = field_class
+        self.start = start
+        self.end = end
+        self.verbose = verbose
+        self.source = source
+        self.when = when
+        self.context = context
+        self.name = None
+        self.slot = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        if '_' + name in owner.__dict__.get('__slots__', ()):
+            self.slot = '_' + name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if self.slot:
+            try:
+                return getattr(instance, self.slot)
+            except AttributeError:
+                pass
+        if self.when and getattr(instance, self.when) is None:
+            raise AttributeError(self.name)
+        data = getattr(instance, self.source)
+        if self.end is None:
+            raw = data[self.start]
+        elif self.end == END:
+            raw = data[self.start:]
+        else:
+            raw = data[self.start:self.end + 1]
+        if self.context:
+            field = self.field_class(raw, verbose=self.verbose, **{
+                self.context: getattr(instance, self.context)})
+        else:
+            field = self.field_class(raw, verbose=self.verbose)
+        # Hand over the number if the owner unpacked it with its layout
+        index = getattr(owner, 'layout_index', None)
+        if index and self.name in index and self.source == owner.layout_source:
+            values = instance.values
+            if index[self.name] < len(values):
+                field._unpacked = values[index[self.name]]
+        if self.slot:
+            setattr(instance, self.slot, field)
+        else:
+            # Later reads find the field in the instance and skip this method
+            instance.__dict__[self.name] = field
+        return field
+
+
+def lazy_fields(cls):
+    """
+    Returns the names of the LazyFields declared on a class
+    """
+    return [name for name in dir(cls)
+            if isinstance(getattr(cls, name, None), LazyField)]
+
+
+# struct codes for the field sizes that a layout unpacks
+LAYOUT_CODES = {1: 'B', 2: 'H', 4: 'L', 8: 'Q'}
+
+
+def layout_spec(cls, source):
+    """
+    Returns (start, size, name) for each LazyField of cls that reads a
+    fixed size number from source, sorted by start
+    """
+    spec = []
+    for name in lazy_fields(cls):
+        field = getattr(cls, name)
+        if field.source != source or field.end == END:
+            continue
+        size = 1 if field.end is None else field.end - field.start + 1
+        if size in LAYOUT_CODES:
+            spec.append((field.start, size, name))
+    return sorted(spec)
+
+
+def compile_layout(spec):
+    """
+    Returns a struct.Struct that unpacks the fields of a layout_spec in one
+    call, skipping the bytes between them
+    """
+    fmt = '<'
+    pos = 0
+    for start, size, name in spec:
+        if start < pos:
+            raise ValueError("Field {0} overlaps the field before it".format(
+                name))
+        if start > pos:
+            fmt += '{0}x'.format(start - pos)
+        fmt += LAYOUT_CODES[size]
+        pos = start + size
+    return struct.Struct(fmt)
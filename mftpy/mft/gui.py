@@ -87,6 +87,10 @@ class Application(Frame):
             self.buttons, text="Export", command=self.exportEntry)
         self.exportButton.grid(row=0, column=1, padx=2, sticky=E+W)
 
+        self.extractButton = Button(
+            self.buttons, text="Extract", command=self.extractData)
+        self.extractButton.grid(row=0, column=2, padx=2, sticky=E+W)
+
     def clearListbox(self):
         self.listbox.delete(0, END)
         self.listitems = []
@@ -103,6 +107,19 @@ class Application(Frame):
             with open(fn, 'wb') as mftfile:
                 mftfile.write(e.dump())
 
+    def extractData(self):
+        """ Save the file content of the selected entry """
+        self.selected = self.listbox.curselection()
+        if self.selected and self.filetype == 'partition':
+            e = self.listitems[int(self.selected[0])]
+            fn = asksaveasfilename(initialfile=e.filename)
+            if fn:
+                try:
+                    with open(fn, 'wb') as datafile:
+                        self.partition.extract(e, datafile)
+                except (ValidationError, ValueError) as err:
+                    showwarning("Unable to extract", str(err))
+
     def buildNotebook(self):
         self.notebook = Notebook(self)
         self.notebook.grid(row=0, column=2, sticky=N+S+W+E, pady=5, padx=5)
@@ -120,30 +137,28 @@ class Application(Frame):
         self.listbox.insert(END, os.path.basename(entry.filename))
 
     def validate_entry(self, filename):
-        if os.path.getsize(filename) == 1024:
+        # A single entry is 1024 bytes, or 4096 on 4Kn volumes
+        if os.path.getsize(filename) in (1024, 4096):
             self.filetype = 'entry'
         else:
             self.filetype = 'partition'
 
         if self.filetype == 'partition':
             p = entry.Partition(filename)
-            while True:
-                try:
-                    w = p.walk()
-                    self.add_entry(w.__next__())
-                except StopIteration:
-                    break
+            self.partition = p
+            for e in p.walk():
+                self.add_entry(e)
 
         else:
             with open(filename, 'rb') as data:
-                d = data.read(1024)
+                d = data.read()
                 e = entry.Entry(d)
                 try:
                     e.validate()
                 except ValidationError:
                     showwarning(
                         "Invalid Mft entry",
-                        "This file is not a valid MFT entry. Its signature value is %s" % e.signature.raw)
+                        "This file is not a valid MFT entry. Its signature value is %s" % bytes(e.signature.raw))
                 else:
                     self.add_entry(e)
 
@@ -0,0 +1,88 @@
+"""
+Decompress LZNT1, the compression of NTFS attributes
+
+A compressed attribute is split into compression units, usually of 16
+clusters. A unit is stored as a series of chunks, each of which holds up
+to 4096 bytes of content. A chunk starts with a two byte header: the low
+12 bits are its size less one and the top bit is set if it is compressed.
+
+A compressed chunk is a series of groups of a flag byte and eight items.
+A clear flag bit is a literal byte and a set bit a two byte back
+reference. The split between the offset and the length of a reference
+depends on how far into the chunk it is.
+"""
+
+from exceptions import ValidationError
+
+# Bytes of content held by a chunk
+CHUNK_SIZE = 4096
+
+COMPRESSED = 0x8000
+SIZE_MASK = 0x0fff
+
+
+def decompress_chunk(data, out):
+    """
+    Appends the content of one compressed chunk, data, to the bytearray out
+    """
+    start = len(out)
+    pos = 0
+    end = len(data)
+    while pos < end:
+        flags = data[pos]
+        pos += 1
+        for bit in range(8):
+            if pos >= end:
+                break
+            if not flags & (1 << bit):
+                out.append(data[pos])
+                pos += 1
+                continue
+            if pos + 2 > end:
+                raise ValidationError("Truncated LZNT1 back reference")
+            token = data[pos] | data[pos + 1] << 8
+            pos += 2
+            written = len(out) - start
+            # The offset gets the bits it needs to reach the chunk start,
+            # at least 4, and the length the rest
+            split = 16 - max(4, (written - 1).bit_length())
+            offset = (token >> split) + 1
+            length = (token & ((1 << split) - 1)) + 3
+            if offset > written:
+                raise ValidationError("LZNT1 back reference out of range")
+            source = len(out) - offset
+            if offset >= length:
+                out += out[source:source + length]
+            else:
+                # The reference overlaps what it writes
+                for i in range(length):
+                    out.append(out[source + i])
+
+
+def decompress(data, size):
+    """
+    Returns the first size bytes of the content of a compression unit
+    """
+    out = bytearray()
+    pos = 0
+    while pos + 2 <= len(data) and len(out) < size:
+        header = data[pos] | data[pos + 1] << 8
+        pos += 2
+        if not header:
+            break
+        end = pos + (header & SIZE_MASK) + 1
+        if end > len(data):
+            raise ValidationError("Truncated LZNT1 chunk")
+        chunk_start = len(out)
+        if header & COMPRESSED:
+            decompress_chunk(data[pos:end], out)
+        else:
+            out += data[pos:end]
+        pos = end
+        # A chunk that ends early is followed by zeros
+        missing = CHUNK_SIZE - (len(out) - chunk_start)
+        if missing > 0:
+            out += bytes(missing)
+    if len(out) < size:
+        out += bytes(size - len(out))
+    return bytes(out[:size])
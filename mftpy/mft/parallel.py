@@ -0,0 +1,104 @@
+"""
+Scan the MFT with several processes
+
+The entries of the MFT are split into shards of shard_size entries. Each
+shard is read and parsed by a worker process that opens the image on its
+own, and comes back as one batch of summaries.
+
+Usage:
+
+    p = entry.Partition('/dev/sda1')
+    for batch in parallel.scan(p, workers=8):
+        for summary in batch:
+            print(summary.record_number, summary.filename)
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import entry
+import reader
+
+# Entries per shard
+DEFAULT_SHARD_SIZE = 65536
+
+
+def shards(extents, record_size, shard_size, end):
+    """
+    Splits the extents of the MFT into extents of at most shard_size
+    entries. end is the size of the volume, for extents without a length.
+    """
+    for extent in extents:
+        length = extent.length
+        if length is None:
+            length = max(end - extent.offset, 0)
+        count = length // record_size
+        for first in range(0, count, shard_size):
+            n = min(shard_size, count - first)
+            yield reader.Extent(
+                extent.record + first,
+                extent.offset + first * record_size,
+                n * record_size)
+
+
+def scan_shard(partition, extent, summarize):
+    """
+    Parses one shard in a worker. Returns the summaries of its entries and
+    the read statistics.
+    """
+    with open(partition.pn, 'rb') as image:
+        records = partition.open_reader(image, [extent])
+        try:
+            entries = entry.parse(
+                records, records.stats, partition.attribute_types)
+            batch = [summarize(e) for e in entries]
+        finally:
+            if partition.use_mmap:
+                records.close()
+    return batch, records.stats
+
+
+def scan(partition, workers=None, shard_size=DEFAULT_SHARD_SIZE,
+         ordered=False, summarize=entry.Entry.summary, stats=None):
+    """
+    Yields the entries of a Partition as batches, one list per shard, of
+    summarize(entry). summarize must be picklable and defaults to
+    Entry.summary.
+
+    With ordered=True the batches come in entry number order, otherwise in
+    the order the workers finish them. The read statistics of all shards
+    are added up in stats, a dict, if it is given and replace
+    partition.stats otherwise, as in Partition.walk.
+    """
+    workers = workers or os.cpu_count() or 1
+    with open(partition.pn, 'rb') as image:
+        end = os.lseek(image.fileno(), 0, os.SEEK_END)
+    jobs = sorted(
+        shards(partition.extents, partition.record_size, shard_size, end),
+        key=lambda extent: extent.record if ordered else extent.offset)
+    jobs.reverse()
+    stats = partition.scan_stats(stats)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a couple of shards per worker in flight, so finished batches
+        # don't pile up when the consumer is slower than the workers
+        pending = deque()
+        try:
+            while jobs or pending:
+                while jobs and len(pending) < workers * 2:
+                    pending.append(pool.submit(
+                        scan_shard, partition, jobs.pop(), summarize))
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                for future in done:
+                    batch, shard_stats = future.result()
+                    for key, value in shard_stats.items():
+                        stats[key] = stats.get(key, 0) + value
+                    yield batch
+        finally:
+            for future in pending:
+                future.cancel()
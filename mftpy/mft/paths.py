@@ -0,0 +1,203 @@
+"""
+Rebuild the full paths of MFT entries
+
+A $FILE_NAME attribute only holds the name of an entry and a reference to
+its parent directory (page 362). PathResolver collects the name and parent
+of every entry of a scan in arrays indexed by entry number, then follows
+the parents up to the root directory. The path of every directory is kept
+once it is known, so each entry is only visited once however deep the tree
+is.
+
+Usage:
+
+    p = entry.Partition('/dev/sda1')
+    resolver = paths.PathResolver.from_partition(p)
+    for number in resolver:
+        print(resolver.path(number))
+"""
+
+from array import array
+from entry import REFERENCE_MASK, ROOT
+
+SEPARATOR = '/'
+
+# Entries that can't be traced back to the root are put under this name
+ORPHAN_DIR = '$OrphanFiles'
+
+# How a path was resolved
+OK = 'ok'
+# The parent entry is missing or not a directory we know
+ORPHAN = 'orphan'
+# The parent entry has been reused, its sequence number changed
+STALE = 'stale'
+# Following the parents leads back to the same entry
+CYCLE = 'cycle'
+
+
+def split_reference(ref):
+    """
+    Returns the entry number and the sequence number of a file reference
+    """
+    return ref & REFERENCE_MASK, ref >> 48
+
+
+class PathResolver(object):
+    """
+    Resolves entry numbers to full paths
+
+    For every entry the parent reference and the sequence number are kept
+    in arrays and the name in a list, all indexed by entry number. Entries
+    are added with add() or add_entry() and can be resolved at any time.
+    """
+    def __init__(self):
+        # Unused slots are zero, an entry without a name is not there
+        self.parents = array('Q')
+        self.sequences = array('H')
+        self.names = []
+        # (path, status) of every directory resolved so far
+        self._dirs = {ROOT: ('', OK)}
+
+    def __len__(self):
+        return len(self.names) - self.names.count(None)
+
+    def __iter__(self):
+        for number, name in enumerate(self.names):
+            if name is not None:
+                yield number
+
+    def __contains__(self, number):
+        return 0 <= number < len(self.names) and self.names[number] is not None
+
+    def _grow(self, number):
+        missing = number + 1 - len(self.names)
+        if missing > 0:
+            self.parents.extend([0] * missing)
+            self.sequences.extend([0] * missing)
+            self.names.extend([None] * missing)
+
+    def add(self, number, sequence, parent_ref, name):
+        """
+        Add an entry. Entries can come in any order and adding an entry
+        again replaces it.
+        """
+        if name is None or parent_ref is None:
+            return
+        self._grow(number)
+        self.parents[number] = parent_ref
+        self.sequences[number] = sequence
+        self.names[number] = name
+        if len(self._dirs) > 1:
+            # Paths resolved so far may run through the replaced entry
+            self._dirs = {ROOT: ('', OK)}
+
+    def add_summary(self, summary):
+        """
+        Add an entry from an entry.Summary
+        """
+        self.add(summary.record_number, summary.sequence, summary.parent_ref,
+                 summary.filename)
+
+    def add_entry(self, e):
+        """
+        Add an entry.Entry. Its long name is preferred over the DOS name.
+        """
+        best = e.file_name()
+        if best is not None:
+            self.add(e.record_number, e.header.sequence,
+                     best.content_value('parent_dir'),
+                     best.name.value)
+
+    @classmethod
+    def from_partition(cls, partition):
+        """
+        Returns a resolver for all entries of a Partition
+        """
+        resolver = cls()
+        for e in partition.walk():
+            resolver.add_entry(e)
+        return resolver
+
+    def _parent(self, number):
+        """
+        Returns the parent entry number of an entry and the status of the
+        link to it
+        """
+        parent, sequence = split_reference(self.parents[number])
+        if parent not in self:
+            return parent, ORPHAN
+        # A sequence number of zero is not checked
+        if sequence and sequence != self.sequences[parent]:
+            return parent, STALE
+        return parent, OK
+
+    def _resolve_dir(self, number):
+        """
+        Returns the (path, status) of the directory number. Every directory
+        on the way up is stored, so it is never followed again.
+        """
+        dirs = self._dirs
+        chain = []
+        seen = set()
+        status = OK
+        while number not in dirs:
+            if number in seen:
+                status = CYCLE
+                break
+            if number not in self:
+                status = ORPHAN
+                break
+            seen.add(number)
+            chain.append(number)
+            parent, link = self._parent(number)
+            if link != OK:
+                status = link
+                break
+            number = parent
+
+        if status == OK:
+            path, status = dirs[number]
+        else:
+            # The chain can't reach the root from its last entry
+            path = SEPARATOR + ORPHAN_DIR
+        for number in reversed(chain):
+            path = path + SEPARATOR + self.names[number]
+            dirs[number] = (path, status)
+        return path, status
+
+    def resolve(self, number):
+        """
+        Returns the full path of an entry and how it was resolved: OK,
+        ORPHAN, STALE or CYCLE
+        """
+        if number == ROOT:
+            return SEPARATOR, OK
+        if number not in self:
+            raise KeyError("Entry {0} has no name".format(number))
+        if number in self._dirs:
+            return self._dirs[number]
+        parent, link = self._parent(number)
+        if link == OK and parent == number:
+            link = CYCLE
+        if link == OK:
+            path, status = self._resolve_dir(parent)
+            if number in self._dirs:
+                # The entry turned out to be part of a loop of directories
+                return self._dirs[number]
+        else:
+            path, status = SEPARATOR + ORPHAN_DIR, link
+        return path + SEPARATOR + self.names[number], status
+
+    def path(self, number):
+        """
+        Returns the full path of an entry
+        """
+        return self.resolve(number)[0]
+
+    def orphans(self):
+        """
+        Yields the entry numbers whose path could not be traced back to the
+        root directory
+        """
+        for number in self:
+            if self.resolve(number)[1] != OK:
+                yield number
@@ -0,0 +1,218 @@
+"""
+Buffered readers for walking the MFT
+
+Reading the table one entry at a time costs a seek and a read for every
+record. The readers here pull the table in large chunks and hand out
+memoryview slices of each chunk, one per MFT entry.
+
+MmapReader maps the whole image instead. Entries are windows into the
+mapping, so the data is only paged in when an entry is parsed.
+
+The MFT is described by a list of extents, one for every data run of
+$MFT. A reader visits the extents in the order they are stored on disk and
+yields (entry number, view) pairs.
+"""
+
+import bisect
+import mmap
+import os
+from collections import namedtuple
+
+# Default size of a single read. Anything from 4 to 64 MiB works well.
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Size of an MFT entry
+RECORD_SIZE = 1024
+
+# A contiguous part of the MFT. It holds the entries from record onwards,
+# starting at byte offset of the volume. A length of None runs to the end
+# of the volume.
+Extent = namedtuple('Extent', ['record', 'offset', 'length'])
+
+
+def contiguous(offset, length=None):
+    """
+    Returns the extents of an MFT that is stored in one piece
+    """
+    return [Extent(0, offset, length)]
+
+
+def mft_extents(runs, cluster_size, record_size=RECORD_SIZE, size=None):
+    """
+    Returns the extents of the MFT from the runs of its $DATA attribute.
+    runs are (vcn, lcn, length) tuples. Only the first size bytes of the
+    table hold entries.
+    """
+    extents = []
+    for vcn, lcn, length in runs:
+        if lcn is None:
+            continue
+        start = vcn * cluster_size
+        length = length * cluster_size
+        if size is not None:
+            length = min(length, size - start)
+        length -= length % record_size
+        if length > 0:
+            extents.append(
+                Extent(start // record_size, lcn * cluster_size, length))
+    return extents
+
+
+def select(extents, record_size, first=0, end=None):
+    """
+    Returns the parts of extents that hold the entries from first up to,
+    but not including, end. An end of None runs to the last entry.
+    """
+    selected = []
+    for extent in extents:
+        start = max(first, extent.record)
+        stop = end
+        if extent.length is not None:
+            last = extent.record + extent.length // record_size
+            stop = last if stop is None else min(stop, last)
+        if stop is not None and start >= stop:
+            continue
+        offset = extent.offset + (start - extent.record) * record_size
+        length = None if stop is None else (stop - start) * record_size
+        selected.append(Extent(start, offset, length))
+    return selected
+
+
+class MftReader(object):
+    """
+    Reads MFT entries from an open file in chunks of chunk_size bytes
+
+    Iterating over the reader yields an (entry number, memoryview) pair per
+    entry. The views share the chunk they were cut from, so no entry data is
+    copied.
+    """
+    def __init__(self, fileobj, extents, record_size=RECORD_SIZE,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        if chunk_size < record_size:
+            raise ValueError(
+                "Chunk size must hold at least one record "
+                "({0} < {1})".format(chunk_size, record_size))
+        self.fileobj = fileobj
+        self.extents = sorted(extents, key=lambda extent: extent.offset)
+        self.record_size = record_size
+        # Only read whole records
+        self.chunk_size = chunk_size - (chunk_size % record_size)
+        self.stats = {
+            'reads': 0,
+            'seeks': 0,
+            'bytes_read': 0,
+            'records': 0,
+        }
+
+    def chunks(self, extent):
+        """
+        Yields an extent as a series of memoryviews of at most chunk_size
+        bytes
+        """
+        self.fileobj.seek(extent.offset)
+        self.stats['seeks'] += 1
+        remaining = extent.length
+        while remaining is None or remaining > 0:
+            size = self.chunk_size
+            if remaining is not None:
+                size = min(size, remaining)
+                remaining -= size
+            # A fresh buffer for every chunk, the views handed out for the
+            # previous chunk may still be in use.
+            chunk = bytearray(size)
+            length = self.fileobj.readinto(chunk)
+            self.stats['reads'] += 1
+            if not length:
+                break
+            self.stats['bytes_read'] += length
+            yield memoryview(chunk)[:length]
+            if length < size:
+                break
+
+    def __iter__(self):
+        size = self.record_size
+        for extent in self.extents:
+            record = extent.record
+            for chunk in self.chunks(extent):
+                for start in range(0, len(chunk) - size + 1, size):
+                    self.stats['records'] += 1
+                    yield record, chunk[start:start + size]
+                    record += 1
+
+
+class MmapReader(object):
+    """
+    Maps an image file or an extracted $MFT and reads entries from the
+    mapping
+
+    Iterating over the reader yields an (entry number, memoryview) pair per
+    entry and reader[n] returns the view of entry number n.
+    """
+    def __init__(self, fileobj, extents, record_size=RECORD_SIZE):
+        self.record_size = record_size
+        # Block devices report a size of zero, so ask for the end instead
+        size = os.lseek(fileobj.fileno(), 0, os.SEEK_END)
+        self.map = mmap.mmap(fileobj.fileno(), size, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.extents = []
+        for extent in sorted(extents, key=lambda extent: extent.record):
+            end = len(self.view)
+            if extent.length is not None:
+                end = min(end, extent.offset + extent.length)
+            length = max(end - extent.offset, 0)
+            self.extents.append(Extent(
+                extent.record, extent.offset,
+                length - length % record_size))
+        self.first_records = [extent.record for extent in self.extents]
+        self.stats = {
+            'reads': 0,
+            'seeks': 0,
+            'bytes_read': 0,
+            'records': 0,
+        }
+
+    def __len__(self):
+        if not self.extents:
+            return 0
+        last = self.extents[-1]
+        return last.record + last.length // self.record_size
+
+    def __getitem__(self, record_number):
+        i = bisect.bisect_right(self.first_records, record_number) - 1
+        if i >= 0:
+            extent = self.extents[i]
+            start = (extent.offset +
+                     (record_number - extent.record) * self.record_size)
+            if start + self.record_size <= extent.offset + extent.length:
+                return self.view[start:start + self.record_size]
+        raise IndexError("MFT entry {0} is out of range".format(
+            record_number))
+
+    def __iter__(self):
+        size = self.record_size
+        view = self.view
+        for extent in sorted(self.extents, key=lambda extent: extent.offset):
+            record = extent.record
+            for start in range(
+                    extent.offset, extent.offset + extent.length, size):
+                self.stats['records'] += 1
+                self.stats['bytes_read'] += size
+                yield record, view[start:start + size]
+                record += 1
+
+    def close(self):
+        """
+        Unmap the image. The mapping stays open for as long as views handed
+        out by the reader are still alive.
+        """
+        try:
+            self.view.release()
+            self.map.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
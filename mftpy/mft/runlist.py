@@ -0,0 +1,112 @@
+"""
+Decode the runlist of a non-resident attribute
+
+Each run starts with a header byte. The low nibble is the size of the run
+length and the high nibble the size of the run offset. The offset is a
+signed value relative to the cluster of the previous run. A run without
+an offset is sparse. A header of zero ends the list.
+"""
+
+from array import array
+from bisect import bisect_right
+
+# Stored as the LCN of a sparse run
+SPARSE = -1
+
+
+class Runlist(object):
+    """
+    The runs of a non-resident attribute
+
+    The runs are kept in three parallel arrays: the first virtual cluster
+    number (VCN), the logical cluster number (LCN) and the length in
+    clusters of every run. Iterating yields (vcn, lcn, length) tuples with
+    an lcn of None for sparse runs.
+    """
+    __slots__ = ('vcns', 'lcns', 'lengths')
+
+    def __init__(self):
+        self.vcns = array('q')
+        self.lcns = array('q')
+        self.lengths = array('q')
+
+    def __len__(self):
+        return len(self.vcns)
+
+    def __iter__(self):
+        for vcn, lcn, length in zip(self.vcns, self.lcns, self.lengths):
+            yield vcn, (None if lcn == SPARSE else lcn), length
+
+    def __repr__(self):
+        return '<Runlist of {0} runs, {1} clusters>'.format(
+            len(self), self.clusters)
+
+    @property
+    def clusters(self):
+        """
+        Returns the number of clusters covered by the runs
+        """
+        return sum(self.lengths)
+
+    def append(self, vcn, lcn, length):
+        """
+        Add a run. Runs must be added in VCN order.
+        """
+        self.vcns.append(vcn)
+        self.lcns.append(SPARSE if lcn is None else lcn)
+        self.lengths.append(length)
+
+    def extend(self, other):
+        """
+        Add the runs of another part of the same attribute
+        """
+        self.vcns.extend(other.vcns)
+        self.lcns.extend(other.lcns)
+        self.lengths.extend(other.lengths)
+
+    def find(self, vcn):
+        """
+        Returns the index of the run that holds vcn
+        """
+        i = bisect_right(self.vcns, vcn) - 1
+        if i < 0 or vcn >= self.vcns[i] + self.lengths[i]:
+            raise IndexError("VCN {0} is not in the runlist".format(vcn))
+        return i
+
+    def lookup(self, vcn):
+        """
+        Returns the LCN that holds vcn, or None if the cluster is sparse
+        """
+        i = self.find(vcn)
+        lcn = self.lcns[i]
+        if lcn == SPARSE:
+            return None
+        return lcn + vcn - self.vcns[i]
+
+
+def decode(data, vcn=0):
+    """
+    Returns the runlist in data as a Runlist. vcn is the first VCN the
+    runlist describes.
+    """
+    runs = Runlist()
+    lcn = 0
+    pos = 0
+    while pos < len(data):
+        header = data[pos]
+        if not header:
+            break
+        length_size = header & 0x0f
+        offset_size = header >> 4
+        pos += 1
+        length = int.from_bytes(data[pos:pos + length_size], 'little')
+        pos += length_size
+        if offset_size:
+            lcn += int.from_bytes(
+                data[pos:pos + offset_size], 'little', signed=True)
+            runs.append(vcn, lcn, length)
+        else:
+            runs.append(vcn, None, length)
+        pos += offset_size
+        vcn += length
+    return runs
@@ -0,0 +1,493 @@
+"""
+Generate synthetic NTFS images for benchmarks
+
+generate() writes an image with a boot sector and an MFT of any number of
+entries, without the need for a real disk. The same seed always gives the
+same image. The mix of entries can be tuned: directories, deleted entries,
+long names, resident, non-resident and compressed $DATA, $ATTRIBUTE_LIST
+attributes and an MFT split into several fragments.
+
+    python synthetic.py image.raw --records 100000 --fragments 4
+
+The image is only as real as the parser needs. The non-resident $DATA
+attributes all point at the same small data area and there are no index
+records, so directories can't be listed from it. Every compressed $DATA
+attribute holds COMPRESSED_CONTENT in the same LZNT1 compression unit.
+"""
+
+import argparse
+import random
+import struct
+import sys
+import lznt1
+
+SECTOR_SIZE = 512
+SECTORS_PER_CLUSTER = 8
+CLUSTER_SIZE = SECTOR_SIZE * SECTORS_PER_CLUSTER
+RECORD_SIZE = 1024
+# 0xF6 is -10, records of 2 ** 10 bytes (page 379)
+RECORD_SIZE_CODE = 0xF6
+
+# First cluster of the MFT
+MFT_CLUSTER = 4
+# Clusters the non-resident $DATA attributes point at
+DATA_CLUSTERS = 16
+
+# Attribute flag of compressed content and the compression unit, 2 ** 4
+# clusters
+COMPRESSED = 0x0001
+COMPRESSION_UNIT = 4
+UNIT_SIZE = CLUSTER_SIZE << COMPRESSION_UNIT
+
+# The content of every compressed $DATA attribute. It ends part way into
+# the last chunk of its unit, which is left out of the compressed data.
+COMPRESSED_CONTENT = b''.join(
+    'Line {0} of a compressed file\n'.format(i % 500).encode('ascii')
+    for i in range(UNIT_SIZE // 20))[:UNIT_SIZE - 1000]
+
+# Bytes of content in an LZNT1 chunk
+LZNT1_CHUNK = 4096
+
+# A chunk worked out by hand: the literals 'abc' and a reference three
+# bytes back of length nine, with a 12 bit length
+LZNT1_VECTOR = (bytes.fromhex('05b0086162630620'), b'abcabcabcabc')
+
+# Offsets in a record
+USA_OFFSET = 48
+ATTRIBUTE_OFFSET = 56
+
+# Entry flags
+IN_USE = 0x0001
+DIRECTORY = 0x0002
+
+# Namespaces of $FILE_NAME
+POSIX, WIN32, DOS, WIN32_AND_DOS = 0, 1, 2, 3
+
+# 2011-01-01 as a FILETIME
+BASE_TIME = 129383136000000000
+# One year in FILETIME units
+YEAR = 365 * 24 * 3600 * 10000000
+
+ROOT = 5
+SYSTEM_FILES = [
+    '$MFT', '$MFTMirr', '$LogFile', '$Volume', '$AttrDef', '.', '$Bitmap',
+    '$Boot', '$BadClus', '$Secure', '$UpCase', '$Extend',
+]
+# Entries after the system files that are left empty
+RESERVED = 16
+
+END_MARKER = 0xffffffff
+
+HEADER = struct.Struct('<4sHHQHHHHLLQH')
+RESIDENT = struct.Struct('<LLBBHHHLHBx')
+NON_RESIDENT = struct.Struct('<LLBBHHHQQHH4xQQQ')
+STANDARD_INFORMATION = struct.Struct('<QQQQLLLLLLQQ')
+FILE_NAME = struct.Struct('<QQQQQQQLLBB')
+ATTRIBUTE_LIST_ENTRY = struct.Struct('<LHBBQQH6x')
+VOLUME_INFORMATION = struct.Struct('<8xBBH4x')
+
+
+def align(n, boundary=8):
+    return (n + boundary - 1) // boundary * boundary
+
+
+def signed_size(value):
+    """
+    Returns the number of bytes needed for value as a signed integer
+    """
+    size = 1
+    while not -(1 << (8 * size - 1)) <= value < (1 << (8 * size - 1)):
+        size += 1
+    return size
+
+
+def encode_runlist(runs):
+    """
+    Encodes (lcn, length) runs as a runlist, see runlist.decode. An lcn of
+    None is a sparse run.
+    """
+    data = bytearray()
+    previous = 0
+    for lcn, length in runs:
+        length_size = (length.bit_length() + 7) // 8 or 1
+        if lcn is None:
+            data.append(length_size)
+            data += length.to_bytes(length_size, 'little')
+            continue
+        offset = lcn - previous
+        offset_size = signed_size(offset)
+        data.append(offset_size << 4 | length_size)
+        data += length.to_bytes(length_size, 'little')
+        data += offset.to_bytes(offset_size, 'little', signed=True)
+        previous = lcn
+    data.append(0)
+    return bytes(data)
+
+
+def resident(attr_type, attr_id, content):
+    length = align(RESIDENT.size + len(content))
+    header = RESIDENT.pack(attr_type, length, 0, 0, RESIDENT.size, 0,
+                           attr_id, len(content), RESIDENT.size, 0)
+    return (header + content).ljust(length, b'\x00')
+
+
+def non_resident(attr_type, attr_id, runs, size, flags=0,
+                 compression_unit=0):
+    data = encode_runlist(runs)
+    clusters = sum(length for _, length in runs)
+    length = align(NON_RESIDENT.size + len(data))
+    header = NON_RESIDENT.pack(
+        attr_type, length, 1, 0, NON_RESIDENT.size, flags, attr_id,
+        0, max(clusters - 1, 0), NON_RESIDENT.size, compression_unit,
+        clusters * CLUSTER_SIZE, size, size)
+    return (header + data).ljust(length, b'\x00')
+
+
+def compress_chunk(chunk):
+    """
+    Returns the LZNT1 compressed form of a chunk of at most 4096 bytes,
+    see lznt1.decompress_chunk. Matches are found through the last few
+    places each three bytes were seen.
+    """
+    out = bytearray()
+    seen = {}
+    pos = 0
+    while pos < len(chunk):
+        flag_at = len(out)
+        out.append(0)
+        for bit in range(8):
+            if pos >= len(chunk):
+                break
+            split = 16 - max(4, (pos - 1).bit_length())
+            max_offset = 1 << (16 - split)
+            max_length = (1 << split) + 2
+            best, best_offset = 0, 0
+            for start in reversed(seen.get(chunk[pos:pos + 3], [])[-8:]):
+                offset = pos - start
+                if offset > max_offset:
+                    break
+                n = 0
+                while (n < max_length and pos + n < len(chunk) and
+                       chunk[pos + n] == chunk[start + n]):
+                    n += 1
+                if n > best:
+                    best, best_offset = n, offset
+            if best >= 3:
+                out += struct.pack(
+                    '<H', (best_offset - 1) << split | (best - 3))
+                out[flag_at] |= 1 << bit
+                step = best
+            else:
+                out.append(chunk[pos])
+                step = 1
+            for i in range(pos, pos + step):
+                seen.setdefault(chunk[i:i + 3], []).append(i)
+            pos += step
+    return bytes(out)
+
+
+def compress_lznt1(data):
+    """
+    Returns data compressed with LZNT1, one chunk per 4096 bytes. A chunk
+    that doesn't get smaller is stored as it is.
+    """
+    out = bytearray()
+    for i in range(0, len(data), LZNT1_CHUNK):
+        chunk = data[i:i + LZNT1_CHUNK]
+        packed = compress_chunk(chunk)
+        if len(packed) < len(chunk):
+            out += struct.pack('<H', 0xb000 | (len(packed) - 1)) + packed
+        else:
+            out += struct.pack('<H', 0x3000 | (len(chunk) - 1)) + chunk
+    return bytes(out)
+
+
+def check_lznt1(unit, content):
+    """
+    Checks lznt1.decompress against LZNT1_VECTOR and against the unit
+    compressed here, so a broken compressor or decompressor is noticed
+    before any image is written
+    """
+    packed, expected = LZNT1_VECTOR
+    if (lznt1.decompress(packed, len(expected)) != expected or
+            compress_lznt1(expected) != packed):
+        raise ValueError("LZNT1 doesn't match the reference chunk")
+    if lznt1.decompress(unit, len(content)) != content:
+        raise ValueError("The compressed unit doesn't decompress")
+
+
+def standard_information(times, flags=0x20):
+    return STANDARD_INFORMATION.pack(*(list(times) + [
+        flags, 0, 0, 0, 0, 0x100, 0, 0]))
+
+
+def file_name(parent_ref, name, times, size, namespace=WIN32):
+    encoded = name.encode('utf-16-le')
+    return FILE_NAME.pack(*([parent_ref] + list(times) + [
+        align(size, CLUSTER_SIZE), size, 0x20, 0, len(name),
+        namespace])) + encoded
+
+
+def apply_fixups(record, usn):
+    """
+    Moves the last two bytes of every sector into the update sequence
+    array and puts the update sequence number in their place (page 354)
+    """
+    sectors = len(record) // SECTOR_SIZE
+    struct.pack_into('<H', record, USA_OFFSET, usn)
+    for i in range(1, sectors + 1):
+        end = i * SECTOR_SIZE - 2
+        record[USA_OFFSET + 2 * i:USA_OFFSET + 2 * i + 2] = \
+            record[end:end + 2]
+        struct.pack_into('<H', record, end, usn)
+
+
+def build_record(number, sequence, flags, attributes, lsn=0, base_ref=0):
+    """
+    Returns an MFT record holding attributes, a list of attribute bytes
+    with the fixups applied
+    """
+    record = bytearray(RECORD_SIZE)
+    body = b''.join(attributes) + struct.pack('<LL', END_MARKER, 0)
+    used = ATTRIBUTE_OFFSET + len(body)
+    if used > RECORD_SIZE:
+        raise ValueError("Entry {0} doesn't fit in a record".format(number))
+    record[:HEADER.size] = HEADER.pack(
+        b'FILE', USA_OFFSET, RECORD_SIZE // SECTOR_SIZE + 1, lsn, sequence,
+        1, ATTRIBUTE_OFFSET, flags, used, RECORD_SIZE, base_ref,
+        len(attributes))
+    record[ATTRIBUTE_OFFSET:used] = body
+    apply_fixups(record, (sequence * 7 + number) & 0xffff or 1)
+    return record
+
+
+class Generator(object):
+    """
+    Builds the records of a synthetic MFT. All random choices come from a
+    random.Random seeded with seed.
+    """
+    def __init__(self, records=10000, seed=0, directories=0.1, deleted=0.1,
+                 long_names=0.1, non_resident=0.3, attribute_lists=0.05,
+                 fragments=1, compressed=0.05):
+        self.count = max(records, RESERVED + 1)
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.directories = directories
+        self.deleted = deleted
+        self.long_names = long_names
+        self.non_resident = non_resident
+        self.attribute_lists = attribute_lists
+        # Share of the non-resident $DATA attributes that are compressed
+        self.compressed = compressed
+        self.fragments = max(fragments, 1)
+        self.dirs = [ROOT]
+        self.layout()
+
+    def layout(self):
+        """
+        Places the fragments of the MFT and the data area in the volume
+        """
+        records_per_cluster = CLUSTER_SIZE // RECORD_SIZE
+        clusters = -(-self.count // records_per_cluster)
+        self.runs = []
+        lcn = MFT_CLUSTER
+        per_fragment = -(-clusters // self.fragments)
+        while clusters > 0:
+            length = min(per_fragment, clusters)
+            self.runs.append((lcn, length))
+            clusters -= length
+            # Leave a gap behind every fragment
+            lcn += length + 1 + self.rng.randrange(8)
+        self.data_cluster = lcn
+        # The compressed unit follows the data area
+        self.compressed_unit = compress_lznt1(COMPRESSED_CONTENT)
+        self.compressed_cluster = lcn + DATA_CLUSTERS
+        self.compressed_clusters = -(-len(self.compressed_unit) //
+                                     CLUSTER_SIZE)
+        check_lznt1(self.compressed_unit, COMPRESSED_CONTENT)
+        self.total_clusters = (self.compressed_cluster +
+                               self.compressed_clusters)
+
+    def times(self):
+        created = BASE_TIME + self.rng.randrange(YEAR)
+        return [created + self.rng.randrange(YEAR // 10) for _ in range(4)]
+
+    def name(self, number):
+        if self.rng.random() < self.long_names:
+            length = self.rng.randrange(100, 256)
+        else:
+            length = self.rng.randrange(4, 24)
+        stem = 'file{0}_'.format(number)
+        letters = ''.join(self.rng.choice('abcdefghijklmnopqrstuvwxyz')
+                          for _ in range(max(length - len(stem) - 4, 1)))
+        return (stem + letters)[:length - 4] + '.dat'
+
+    def data(self, attr_id, room):
+        """
+        Returns a $DATA attribute and its size. Small content stays
+        resident if it fits in room.
+        """
+        if self.rng.random() < self.non_resident:
+            if self.rng.random() < self.compressed:
+                unit = 1 << COMPRESSION_UNIT
+                runs = [(self.compressed_cluster, self.compressed_clusters),
+                        (None, unit - self.compressed_clusters)]
+                size = len(COMPRESSED_CONTENT)
+                return non_resident(128, attr_id, runs, size, COMPRESSED,
+                                    COMPRESSION_UNIT), size
+            clusters = self.rng.randrange(1, DATA_CLUSTERS + 1)
+            size = clusters * CLUSTER_SIZE - self.rng.randrange(CLUSTER_SIZE)
+            runs = []
+            start = self.data_cluster
+            # Split larger files in two runs
+            if clusters > 1 and self.rng.random() < 0.5:
+                half = clusters // 2
+                runs = [(start + half, clusters - half), (start, half)]
+            else:
+                runs = [(start, clusters)]
+            return non_resident(128, attr_id, runs, size), size
+        size = self.rng.randrange(0, max(min(room, 700) - 32, 1))
+        content = self.rng.getrandbits(8 * size).to_bytes(size, 'little') \
+            if size else b''
+        return resident(128, attr_id, content), size
+
+    def system_record(self, number):
+        name = SYSTEM_FILES[number]
+        times = [BASE_TIME] * 4
+        flags = IN_USE | (DIRECTORY if number == ROOT else 0)
+        attributes = [
+            resident(16, 0, standard_information(times, 0x06)),
+            resident(48, 1, file_name(ROOT | 5 << 48, name, times, 0)),
+        ]
+        if number == 0:
+            size = self.count * RECORD_SIZE
+            attributes.append(non_resident(128, 2, self.runs, size))
+        elif number == 3:
+            version = VOLUME_INFORMATION.pack(3, 1, 0)
+            attributes.append(resident(112, 2, version))
+        elif number != ROOT:
+            attributes.append(resident(128, 2, b''))
+        sequence = 5 if number == ROOT else number or 1
+        return build_record(number, sequence, flags, attributes)
+
+    def record(self, number):
+        """
+        Returns the bytes of entry number
+        """
+        if number < len(SYSTEM_FILES):
+            return self.system_record(number)
+        if number < RESERVED:
+            return bytearray(RECORD_SIZE)
+
+        rng = self.rng
+        is_dir = rng.random() < self.directories
+        # Children of directories reference them with sequence number 1
+        sequence = 1 if is_dir else rng.randrange(1, 8)
+        flags = DIRECTORY if is_dir else 0
+        if rng.random() >= self.deleted:
+            flags |= IN_USE
+        parent = rng.choice(self.dirs[-500:])
+        parent_ref = parent | (5 if parent == ROOT else 1) << 48
+        times = self.times()
+        name = self.name(number)
+        with_list = rng.random() < self.attribute_lists
+
+        si = resident(16, 0, standard_information(times))
+        data, size = (None, 0)
+        if not is_dir:
+            used = (ATTRIBUTE_OFFSET + len(si) +
+                    align(RESIDENT.size + FILE_NAME.size + 2 * len(name)) +
+                    RESIDENT.size + 3 * ATTRIBUTE_LIST_ENTRY.size + 8)
+            data, size = self.data(3, RECORD_SIZE - used)
+        attributes = [si, resident(48, 1, file_name(
+            parent_ref, name, times, size))]
+        if data is not None:
+            attributes.append(data)
+        if with_list:
+            own_ref = number | sequence << 48
+            listing = b''.join(
+                ATTRIBUTE_LIST_ENTRY.pack(
+                    attr_type, ATTRIBUTE_LIST_ENTRY.size, 0, 0x1a, 0,
+                    own_ref, attr_id)
+                for attr_id, attr_type in enumerate(
+                    [16, 48, 128][:len(attributes)]))
+            attributes.insert(1, resident(32, 2, listing))
+        if is_dir and flags & IN_USE:
+            self.dirs.append(number)
+        return build_record(number, sequence, flags, attributes,
+                            lsn=rng.getrandbits(32))
+
+    def records(self):
+        """
+        Yields the bytes of every entry in entry number order
+        """
+        for number in range(self.count):
+            yield self.record(number)
+
+    def boot_sector(self):
+        sector = bytearray(SECTOR_SIZE)
+        sector[0:3] = b'\xeb\x52\x90'
+        sector[3:11] = b'NTFS    '
+        struct.pack_into('<HB', sector, 11, SECTOR_SIZE, SECTORS_PER_CLUSTER)
+        sector[21] = 0xf8
+        struct.pack_into('<QQQ', sector, 40,
+                         self.total_clusters * SECTORS_PER_CLUSTER,
+                         MFT_CLUSTER, MFT_CLUSTER - 2)
+        sector[64] = RECORD_SIZE_CODE
+        sector[68] = 1
+        struct.pack_into('<Q', sector, 72,
+                         random.Random(self.seed).getrandbits(64))
+        struct.pack_into('<H', sector, 510, 0xaa55)
+        return sector
+
+    def write(self, sink):
+        """
+        Writes the whole image to sink, a binary file
+        """
+        sink.write(self.boot_sector())
+        records = self.records()
+        for lcn, length in self.runs:
+            sink.seek(lcn * CLUSTER_SIZE)
+            for _ in range(length * CLUSTER_SIZE // RECORD_SIZE):
+                sink.write(next(records, bytes(RECORD_SIZE)))
+        sink.seek(self.compressed_cluster * CLUSTER_SIZE)
+        sink.write(self.compressed_unit)
+        sink.seek(self.total_clusters * CLUSTER_SIZE - 1)
+        sink.write(b'\x00')
+
+
+def generate(path, records=10000, seed=0, **options):
+    """
+    Writes a synthetic image with records entries to path and returns the
+    Generator that built it. The options are those of Generator.
+    """
+    generator = Generator(records, seed, **options)
+    with open(path, 'wb') as sink:
+        generator.write(sink)
+    return generator
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic NTFS image')
+    parser.add_argument('path')
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--directories', type=float, default=0.1)
+    parser.add_argument('--deleted', type=float, default=0.1)
+    parser.add_argument('--long-names', type=float, default=0.1)
+    parser.add_argument('--non-resident', type=float, default=0.3)
+    parser.add_argument('--attribute-lists', type=float, default=0.05)
+    parser.add_argument('--fragments', type=int, default=1)
+    parser.add_argument('--compressed', type=float, default=0.05)
+    args = parser.parse_args(argv)
+    generate(args.path, args.records, args.seed,
+             directories=args.directories, deleted=args.deleted,
+             long_names=args.long_names, non_resident=args.non_resident,
+             attribute_lists=args.attribute_lists, fragments=args.fragments,
+             compressed=args.compressed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,3 +6,37 @@ def byte_range(data, start, end=None):
         return data[start:end + 1]
     else:
         return data[start]
+
+
+# NTFS protects every 512 bytes of a record, whatever the sector size
+FIXUP_STRIDE = 512
+
+
+def apply_fixups(data, offset, count, stride=FIXUP_STRIDE):
+    """
+    Returns a copy of the record with the fixup array applied (page 354)
+
+    The first value of the array is the signature value. It is written over
+    the last two bytes of every 512 byte block of the record, and the
+    original bytes are kept in the rest of the array. The record is copied
+    once and patched in place.
+
+    Returns the fixed record and False if a block did not end with the
+    signature value. Such a record was torn by an interrupted write.
+    """
+    fixed = bytearray(data)
+    if offset + 2 * count > len(fixed):
+        return fixed, False
+    complete = True
+    first, second = fixed[offset], fixed[offset + 1]
+    for i in range(1, count):
+        end = i * stride
+        if end > len(fixed):
+            complete = False
+            break
+        if fixed[end - 2] != first or fixed[end - 1] != second:
+            complete = False
+            continue
+        fixed[end - 2] = fixed[offset + 2 * i]
+        fixed[end - 1] = fixed[offset + 2 * i + 1]
+    return fixed, complete
@@ -0,0 +1,186 @@
+"""
+Random access to the entries of a volume
+
+Partition reads the MFT from start to end. Volume keeps the image open
+with the geometry of the partition and the extents of the MFT, so a single
+entry can be read with one read wherever it is:
+
+    v = volume.Volume('/dev/sda1')
+    print(v[5].filename)
+    for e in v.get_many([40, 41, 42, 1000]):
+        print(e.record_number, e.filename)
+
+get_many() sorts the requested entries by their place on disk and reads
+runs of nearby entries with one read each. Decoded entries are kept in a
+cache of the cache_size entries used most recently.
+
+A Volume can be pickled, to parallel.scan for example. The image and the
+cache are left out and the image is opened again when it is first read.
+"""
+
+import bisect
+import os
+from collections import OrderedDict
+import entry
+
+# Number of decoded entries kept
+DEFAULT_CACHE_SIZE = 4096
+
+# Entries this many bytes apart or closer are read together
+DEFAULT_MAX_GAP = 64 * 1024
+
+
+class Volume(entry.Partition):
+    """
+    A Partition that stays open for random access to its entries
+    """
+    def __init__(self, partition_name=None, cache_size=DEFAULT_CACHE_SIZE,
+                 max_gap=DEFAULT_MAX_GAP, **kwargs):
+        super().__init__(partition_name, **kwargs)
+        self.cache_size = cache_size
+        self.max_gap = max_gap
+        self.cache = OrderedDict()
+        self.by_record = sorted(self.extents, key=lambda e: e.record)
+        self.first_records = [extent.record for extent in self.by_record]
+        self._image = open(self.pn, 'rb')
+        # Random access reads only, see walk_stats for scans
+        self.stats = {'reads': 0, 'bytes_read': 0, 'hits': 0, 'misses': 0}
+        # Read statistics of the last walk or scan
+        self.walk_stats = {}
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = open(self.pn, 'rb')
+        return self._image
+
+    def close(self):
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_image'] = None
+        state['cache'] = OrderedDict()
+        return state
+
+    def scan_stats(self, stats=None):
+        """
+        Like Partition.scan_stats, but a new dict replaces walk_stats, so
+        `stats` keeps counting the random access reads
+        """
+        if stats is None:
+            stats = self.walk_stats = {}
+        return super().scan_stats(stats)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def offset_of(self, record_number):
+        """
+        Returns the byte offset of an entry in the volume
+        """
+        i = bisect.bisect_right(self.first_records, record_number) - 1
+        if i >= 0:
+            extent = self.by_record[i]
+            start = (record_number - extent.record) * self.record_size
+            if extent.length is None or start < extent.length:
+                return extent.offset + start
+        raise IndexError("MFT entry {0} is out of range".format(
+            record_number))
+
+    def read(self, offset, size):
+        """
+        Reads size bytes at offset without moving a shared file position
+        """
+        self.stats['reads'] += 1
+        if hasattr(os, 'pread'):
+            data = os.pread(self.image.fileno(), size, offset)
+        else:
+            self.image.seek(offset)
+            data = self.image.read(size)
+        self.stats['bytes_read'] += len(data)
+        return data
+
+    def _remember(self, e):
+        self.cache[e.record_number] = e
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _cached(self, record_number):
+        try:
+            e = self.cache[record_number]
+        except KeyError:
+            self.stats['misses'] += 1
+            return None
+        self.cache.move_to_end(record_number)
+        self.stats['hits'] += 1
+        return e
+
+    def __getitem__(self, record_number):
+        """
+        Returns the Entry of an entry number, whether it is in use or not
+        """
+        e = self._cached(record_number)
+        if e is None:
+            data = self.read(self.offset_of(record_number), self.record_size)
+            if len(data) < self.record_size:
+                raise IndexError("MFT entry {0} is past the end of the "
+                                 "volume".format(record_number))
+            e = entry.Entry(bytes(data), record_number,
+                            self.attribute_types)
+            self._remember(e)
+        return e
+
+    def runs(self, record_numbers):
+        """
+        Groups entry numbers into reads. Returns a list of (offset, size,
+        [(entry number, position in the read)]) sorted by offset.
+        """
+        located = sorted((self.offset_of(n), n) for n in record_numbers)
+        runs = []
+        for offset, n in located:
+            if runs:
+                start, size, members = runs[-1]
+                end = start + size
+                if (offset - end <= self.max_gap and
+                        offset + self.record_size - start <= self.chunk_size):
+                    size = max(end, offset + self.record_size) - start
+                    members.append((n, offset - start))
+                    runs[-1] = (start, size, members)
+                    continue
+            runs.append((offset, self.record_size, [(n, 0)]))
+        return runs
+
+    def get_many(self, record_numbers):
+        """
+        Returns the Entries of several entry numbers in the order they were
+        asked for. Entries that aren't cached are read in as few reads as
+        possible.
+        """
+        found = {}
+        missing = set()
+        for n in record_numbers:
+            if n in found or n in missing:
+                continue
+            e = self._cached(n)
+            if e is None:
+                missing.add(n)
+            else:
+                found[n] = e
+        for offset, size, members in self.runs(missing):
+            view = memoryview(self.read(offset, size))
+            for n, start in members:
+                data = view[start:start + self.record_size]
+                if len(data) < self.record_size:
+                    raise IndexError("MFT entry {0} is past the end of the "
+                                     "volume".format(n))
+                # Copied, so a cached entry doesn't keep the whole read
+                e = found[n] = entry.Entry(bytes(data), n,
+                                           self.attribute_types)
+                self._remember(e)
+        return [found[n] for n in record_numbers]